@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark the putty rule engine with synthetic sources and rules.
+
+Each scenario generates files, errors and putty rules, and times
+deciding whether to ignore each error with `PuttyIgnoreCode`, as flake8
+does, and with `Rule.match` of every rule of the same options.
+
+Usage::
+
+  python benchmarks/benchmark.py
+  python benchmarks/benchmark.py --scenario regex --repeat 5
+  python benchmarks/benchmark.py --save-baseline benchmarks/baseline.json
+
+Results are compared with ``benchmarks/baseline.json`` if it exists, and
+the exit status is 1 if the speedup of `PuttyIgnoreCode` over `Rule.match`
+in a scenario is lower than its baseline by more than the tolerance.  The
+speedup is compared, rather than errors per second, as it mostly does not
+depend on the speed of the machine.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import optparse
+import os
+import platform
+import random
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flake8_putty import __version__  # noqa: E402
+from flake8_putty.extension import (  # noqa: E402
+    PuttyExtension,
+    compile_rule_sets,
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+DEFAULT_TOLERANCE = 0.25
+
+PERCENTILES = (50, 90, 99)
+
+CODES = [
+    'E101', 'E111', 'E126', 'E128', 'E201', 'E231', 'E261', 'E302',
+    'E501', 'E731', 'W291', 'W391', 'W503', 'F401', 'F811', 'F821',
+    'C901', 'D100', 'D102', 'N802',
+]
+
+WORDS = ['foo', 'bar', 'baz', 'qux', 'spam', 'eggs', 'ham', 'token']
+
+MARKERS = ["python_version > '2.4'", "python_version < '2.4'"]
+
+SCENARIOS = {
+    'small': dict(
+        files=20, lines=50, errors_per_line=0.2,
+        rules=10, regex=0.2, codes=0.2, markers=0.0,
+    ),
+    'files': dict(
+        files=200, lines=20, errors_per_line=0.5,
+        rules=200, regex=0.0, codes=0.0, markers=0.0,
+    ),
+    'regex': dict(
+        files=20, lines=100, errors_per_line=1.0,
+        rules=100, regex=0.8, codes=0.0, markers=0.0,
+    ),
+    'codes': dict(
+        files=20, lines=100, errors_per_line=1.0,
+        rules=100, regex=0.1, codes=0.8, markers=0.0,
+    ),
+    'markers': dict(
+        files=20, lines=100, errors_per_line=1.0,
+        rules=100, regex=0.2, codes=0.2, markers=0.5,
+    ),
+    'dense': dict(
+        files=5, lines=200, errors_per_line=5.0,
+        rules=50, regex=0.5, codes=0.3, markers=0.1,
+    ),
+}
+
+
+class BenchmarkOptions(object):
+
+    """Options as parsed by flake8."""
+
+    def __init__(self, putty_ignore):
+        """Constructor."""
+        self.putty_ignore = putty_ignore
+        self.putty_select = ''
+        self.putty_auto_ignore = True
+        self.putty_eager_scan = False
+        self.putty_cache_dir = ''
+        self.putty_cache_size = 64
+        self.putty_baseline = ''
+        self.putty_warm = False
+        self.putty_stats = None
+        self.putty_engine = 'compiled'
+        self.verbose = 0
+        self.select = ()
+        self.ignore = ('E123', 'E226')
+        self.report = BenchmarkReporter('', [])
+
+
+class BenchmarkReporter(object):
+
+    """Reporter with the state used by putty."""
+
+    def __init__(self, filename, lines):
+        """Constructor."""
+        self.filename = filename
+        self.lines = lines
+        self.counters = {}
+
+
+def generate_files(rng, files, lines, errors_per_line):
+    """Return a list of filename, source lines and errors of each file."""
+    generated = []
+    for i in range(files):
+        filename = 'pkg%d/mod%d.py' % (i % 10, i)
+        source = []
+        for j in range(lines):
+            line = '%s = %s(%d)' % (
+                rng.choice(WORDS), rng.choice(WORDS) + str(j % 50), j)
+            if rng.random() < 0.05:
+                line += '  # flake8: disable=%s' % rng.choice(CODES)
+            source.append(line + '\n')
+
+        count = int(round(lines * errors_per_line))
+        errors = sorted(
+            (rng.randint(1, lines), rng.choice(CODES)) for k in range(count))
+        generated.append((filename, source, errors))
+    return generated
+
+
+def generate_rules(rng, rules, regex, codes, markers):
+    """Return putty rules text with the given fractions of selector types."""
+    text = []
+    for i in range(rules):
+        selectors = []
+        if rng.random() < 0.5:
+            selectors.append(rng.choice([
+                'pkg%d/' % rng.randint(0, 9),
+                'pkg%d/mod%d.py' % (rng.randint(0, 9), rng.randint(0, 99)),
+                'pkg%d/*.py' % rng.randint(0, 9),
+            ]))
+        if rng.random() < regex:
+            selectors.append('/%s%d/' % (rng.choice(WORDS), rng.randint(0, 49)))
+        if rng.random() < codes:
+            selectors.append(rng.choice(CODES))
+        if rng.random() < markers:
+            selectors.append(rng.choice(MARKERS))
+        if not selectors:
+            selectors.append('pkg%d/' % rng.randint(0, 9))
+
+        rule_codes = ','.join(rng.sample(CODES, rng.randint(1, 3)))
+        if rng.random() < 0.8:
+            rule_codes = '+' + rule_codes
+        text.append('%s : %s' % (', '.join(selectors), rule_codes))
+    return '\n'.join(text)
+
+
+def percentile(sorted_values, percent):
+    """Return the nearest-rank percentile of sorted values."""
+    index = int(round(percent / 100 * len(sorted_values) + 0.5)) - 1
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+
+def time_ignore_code(putty_ignore, files):
+    """Return the seconds taken by `PuttyIgnoreCode` for each error."""
+    options = BenchmarkOptions(putty_ignore)
+    PuttyExtension.parse_options(options)
+    ignore_error = options.ignore_code.ignore_error
+
+    latencies = []
+    for filename, lines, errors in files:
+        reporter = BenchmarkReporter(filename, lines)
+        for line_number, code in errors:
+            start = default_timer()
+            ignore_error(reporter, line_number, code)
+            latencies.append(default_timer() - start)
+    return latencies
+
+
+def time_rule_match(putty_ignore, files):
+    """Return the seconds taken by `Rule.match` of all rules for each error.
+
+    The rules are those of `time_ignore_code`, including the rule of
+    ``# flake8: disable`` comments.
+    """
+    rules = [
+        rule
+        for rule_set in compile_rule_sets(BenchmarkOptions(putty_ignore))
+        for rule in rule_set.parsed_rules
+    ]
+
+    latencies = []
+    for filename, lines, errors in files:
+        for line_number, code in errors:
+            line = lines[line_number - 1]
+            start = default_timer()
+            for rule in rules:
+                rule.match(filename, line, [code])
+            latencies.append(default_timer() - start)
+    return latencies
+
+
+ENGINES = (
+    ('ignore_code', time_ignore_code),
+    ('rule_match', time_rule_match),
+)
+
+
+def run_scenario(params, repeat, seed):
+    """Return the results of each engine for a scenario."""
+    rng = random.Random(seed)
+    files = generate_files(
+        rng, params['files'], params['lines'], params['errors_per_line'])
+    putty_ignore = generate_rules(
+        rng, params['rules'], params['regex'], params['codes'],
+        params['markers'])
+
+    results = {}
+    for name, engine in ENGINES:
+        # The fastest run has the least interference
+        latencies = min(
+            (engine(putty_ignore, files) for i in range(repeat)), key=sum)
+        total = sum(latencies)
+        latencies.sort()
+        result = {
+            'errors': len(latencies),
+            'errors_per_second': len(latencies) / total if total else 0,
+        }
+        for percent in PERCENTILES:
+            result['p%d_us' % percent] = (
+                percentile(latencies, percent) * 1e6 if latencies else 0)
+        results[name] = result
+    results['ignore_code']['speedup'] = speedup(results)
+    return results
+
+
+def speedup(engines):
+    """Return errors per second of `PuttyIgnoreCode` over `Rule.match`."""
+    reference = engines['rule_match']['errors_per_second']
+    if not reference:
+        return None
+    return engines['ignore_code']['errors_per_second'] / reference
+
+
+def compare(results, baseline, tolerance):
+    """Return list of descriptions of speedups lower than the baseline."""
+    regressions = []
+    for scenario, engines in sorted(results.items()):
+        try:
+            expected = speedup(baseline[scenario])
+        except KeyError:
+            continue
+        actual = speedup(engines)
+        if not expected or actual is None:
+            continue
+        ratio = actual / expected
+        engines['ignore_code']['baseline_ratio'] = ratio
+        if ratio < 1 - tolerance:
+            regressions.append(
+                '%s: speedup %.2f is %.0f%% of baseline %.2f' % (
+                    scenario, actual, ratio * 100, expected))
+    return regressions
+
+
+def _format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, int):
+        return '%d' % value
+    return '%.2f' % value
+
+
+def print_results(results):
+    """Print a table of results."""
+    columns = ['errors', 'errors_per_second'] + [
+        'p%d_us' % percent for percent in PERCENTILES] + [
+        'speedup', 'baseline_ratio']
+    print('%-8s %-12s' % ('scenario', 'engine') +
+          ''.join(' %17s' % column for column in columns))
+    for scenario, engines in sorted(results.items()):
+        for engine, result in sorted(engines.items()):
+            values = [result.get(column) for column in columns]
+            print('%-8s %-12s' % (scenario, engine) + ''.join(
+                ' %17s' % _format_value(value) for value in values))
+
+
+def main(argv=None):
+    """Run the benchmarks."""
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option(
+        '--scenario', action='append', dest='scenarios',
+        choices=sorted(SCENARIOS),
+        help='scenario to run, repeatable (default: all)',
+    )
+    for name in ('files', 'lines', 'rules'):
+        parser.add_option(
+            '--' + name, type='int',
+            help='override the number of %s of each scenario' % name,
+        )
+    for name in ('errors_per_line', 'regex', 'codes', 'markers'):
+        parser.add_option(
+            '--' + name.replace('_', '-'), dest=name, type='float',
+            help=('override the errors per line of each scenario'
+                  if name == 'errors_per_line' else
+                  'override the fraction of rules with %s selectors' % name),
+        )
+    parser.add_option(
+        '--repeat', type='int', default=3,
+        help='runs of each scenario, keeping the fastest (default: 3)',
+    )
+    parser.add_option(
+        '--seed', type='int', default=0,
+        help='seed of the generated files and rules (default: 0)',
+    )
+    parser.add_option(
+        '--baseline', default=DEFAULT_BASELINE,
+        help='baseline JSON to compare with (default: %default)',
+    )
+    parser.add_option(
+        '--tolerance', type='float', default=DEFAULT_TOLERANCE,
+        help=('allowed fraction of the baseline speedup lost '
+              '(default: %default)'),
+    )
+    parser.add_option(
+        '--save-baseline', metavar='path',
+        help='write the results as a baseline JSON',
+    )
+    options, args = parser.parse_args(argv)
+
+    results = {}
+    for scenario in options.scenarios or sorted(SCENARIOS):
+        params = dict(SCENARIOS[scenario])
+        for name in params:
+            if getattr(options, name) is not None:
+                params[name] = getattr(options, name)
+        results[scenario] = run_scenario(params, options.repeat, options.seed)
+
+    regressions = []
+    if os.path.exists(options.baseline) and not options.save_baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], options.tolerance)
+
+    print_results(results)
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as f:
+            json.dump({
+                'putty_version': __version__,
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    for regression in regressions:
+        print('Slower than baseline: ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
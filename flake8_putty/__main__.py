@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty commands, run as ``python -m flake8_putty``."""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys
+
+USAGE = """usage:
+  python -m flake8_putty filter [flake8 options] [report ...]
+  python -m flake8_putty baseline --putty-baseline=path [flake8 options] [path ...]"""
+
+
+def main(argv=None):
+    """Run the command named by the first argument."""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+
+    if command == 'filter':
+        from flake8_putty.report import filter_main
+        return filter_main(argv[1:])
+    if command == 'baseline':
+        from flake8_putty.baseline import baseline_main
+        return baseline_main(argv[1:])
+
+    print(USAGE, file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty baseline of existing errors."""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import hashlib
+import struct
+import sys
+
+from flake8.engine import pep8
+
+from flake8_putty.config import relative_filename
+
+BASELINE_MAGIC = b'putty-baseline 1\n'
+
+# Each key is an unsigned 64 bit int, little-endian
+KEY_FORMAT = '<Q'
+KEY_SIZE = struct.calcsize(KEY_FORMAT)
+
+
+def normalise_line(line):
+    """Return line with whitespace collapsed, so indentation changes match."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    return ' '.join(line.split())
+
+
+def file_key(filename):
+    """Return filename relative to the current directory, using '/'."""
+    return relative_filename(filename)
+
+
+def error_key(filename_key, code, line):
+    """Return the key of an error, which does not depend on its line number.
+
+    filename_key is the `file_key` of the file of the error.
+    """
+    text = '\0'.join((filename_key, code, normalise_line(line)))
+    digest = hashlib.sha1(text.encode('utf-8', 'replace')).digest()
+    return struct.unpack(KEY_FORMAT, digest[:KEY_SIZE])[0]
+
+
+class Baseline(object):
+
+    """Keys of the errors of a baseline, found with a set lookup."""
+
+    def __init__(self, keys, digest=''):
+        """Constructor."""
+        self.keys = frozenset(keys)
+        # Hash of the baseline file, for keys of cached verdicts
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def file_key(filename):
+        """Return the `file_key` of filename."""
+        return file_key(filename)
+
+    def ignores(self, filename_key, code, line):
+        """Check if the error is in the baseline."""
+        return error_key(filename_key, code, line) in self.keys
+
+
+def load(path):
+    """Return the `Baseline` of a baseline file.
+
+    A missing file is an empty baseline.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return Baseline(())
+
+    if not data.startswith(BASELINE_MAGIC):
+        raise ValueError('%s is not a putty baseline' % path)
+    count = (len(data) - len(BASELINE_MAGIC)) // KEY_SIZE
+    keys = struct.unpack_from('<%dQ' % count, data, len(BASELINE_MAGIC))
+    return Baseline(keys, hashlib.sha1(data).hexdigest())
+
+
+def dump(path, keys):
+    """Write keys to a baseline file, sorted so the file is reproducible."""
+    keys = sorted(keys)
+    with open(path, 'wb') as f:
+        f.write(BASELINE_MAGIC)
+        f.write(struct.pack('<%dQ' % len(keys), *keys))
+
+
+class BaselineReport(pep8.BaseReport):
+
+    """Report recording the key of each error which is not ignored."""
+
+    def __init__(self, options):
+        """Constructor."""
+        super(BaselineReport, self).__init__(options)
+        self.keys = set()
+
+    def error(self, line_number, offset, text, check):
+        """Report an error, recording its key."""
+        code = super(BaselineReport, self).error(
+            line_number, offset, text, check)
+        if code:
+            try:
+                line = self.lines[line_number - 1]
+            except IndexError:
+                line = ''
+            self.keys.add(error_key(file_key(self.filename), code, line))
+        return code
+
+
+def baseline_main(args):
+    """Check files and write the errors to the putty baseline.
+
+    args are flake8 options and paths, with --putty-baseline naming the
+    baseline file.  The existing baseline is not used while checking.
+    Return 0, or 2 if the baseline is not named.
+    """
+    from flake8_putty.report import get_style_guide
+
+    # Errors are recorded in this process
+    style_guide = get_style_guide(list(args) + ['--jobs', '1'], '.')
+    options = style_guide.options
+    path = options.putty_baseline
+    if not path:
+        print('putty: --putty-baseline is required', file=sys.stderr)
+        return 2
+
+    # The existing baseline, and verdicts cached with it, are not used
+    options.ignore_code.baseline = None
+    options.ignore_code.verdict_cache = None
+
+    report = style_guide.init_report(BaselineReport)
+    style_guide.check_files()
+    dump(path, report.keys)
+    print('putty: %d errors written to %s' % (len(report.keys), path))
+    return 0
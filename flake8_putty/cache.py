@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty on-disk cache of compiled rule sets and verdicts.
+
+Entries are JSON, rather than pickles, as the cache directory may be
+set by the configuration of the checked project, and loading a pickle
+may run any code.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+
+from flake8_putty.config import (
+    CodeSelector,
+    EnvironmentMarkerSelector,
+    FileSelector,
+    RegexSelector,
+    Rule,
+    relative_filename,
+)
+from flake8_putty.extension import AutoLineDisableRule
+from flake8_putty.ruleset import RuleSet
+
+# Increment when the cached JSON changes incompatibly
+CACHE_FORMAT = 2
+
+CACHE_PREFIX = 'putty-rules-'
+VERDICT_PREFIX = 'putty-verdicts-'
+CACHE_SUFFIX = '.json'
+
+SELECTOR_KINDS = {
+    'regex': RegexSelector,
+    'file': FileSelector,
+    'code': CodeSelector,
+    'marker': EnvironmentMarkerSelector,
+}
+
+AUTO_LINE_DISABLE_RULE = 'auto'
+
+
+def _environment():
+    """Return the values environment markers may depend on.
+
+    These are found without packaging, which is slow to import.
+    """
+    return (
+        sys.version,
+        sys.platform,
+        os.name,
+        platform.python_implementation(),
+        platform.machine(),
+        platform.system(),
+        platform.release(),
+        platform.version(),
+    )
+
+
+def cache_key(version, *values):
+    """Return a hash of values, for the putty version and environment.
+
+    Rule sets fold environment markers when compiled, so the environment
+    is part of the key.
+    """
+    key = repr((CACHE_FORMAT, version, _environment(), values))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cache_filename(cache_dir, key, prefix=CACHE_PREFIX):
+    """Return the filename of the cache entry for key."""
+    return os.path.join(cache_dir, prefix + key + CACHE_SUFFIX)
+
+
+def load(cache_dir, key, prefix=CACHE_PREFIX):
+    """Return the JSON value cached for key, or None if not cached or invalid.
+
+    The modification time of the entry is updated, as it was used.
+    """
+    filename = cache_filename(cache_dir, key, prefix)
+    try:
+        with open(filename, 'rb') as f:
+            value = json.loads(f.read().decode('utf-8'))
+        os.utime(filename, None)
+    except Exception:
+        return None
+    return value
+
+
+def dump(cache_dir, key, value, prefix=CACHE_PREFIX):
+    """Cache the JSON value for key, ignoring any error writing the cache."""
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, temp_filename = tempfile.mkstemp(
+            prefix=prefix, suffix='.tmp', dir=cache_dir)
+    except (IOError, OSError):
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(value).encode('utf-8'))
+        # On Windows, this fails if another process has written the entry
+        os.rename(temp_filename, cache_filename(cache_dir, key, prefix))
+    except Exception:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+
+
+def prune(cache_dir, max_size):
+    """Remove the least recently used entries until within max_size bytes."""
+    entries = []
+    total = 0
+    try:
+        filenames = os.listdir(cache_dir)
+    except OSError:
+        return
+    for filename in filenames:
+        if not (filename.startswith((CACHE_PREFIX, VERDICT_PREFIX)) and
+                filename.endswith(CACHE_SUFFIX)):
+            continue
+        filename = os.path.join(cache_dir, filename)
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, filename))
+        total += stat.st_size
+
+    entries.sort()
+    for mtime, size, filename in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+        total -= size
+
+
+def _string(value):
+    if not isinstance(value, type('')):
+        raise ValueError('Expected a string: %r' % (value, ))
+    return value
+
+
+def rule_to_json(rule):
+    """Return the JSON value of a rule.
+
+    A `Rule` is a list of its [kind, text] selectors, its codes and
+    whether they are appended.
+    """
+    if isinstance(rule, AutoLineDisableRule):
+        return AUTO_LINE_DISABLE_RULE
+
+    kinds = dict((cls, kind) for kind, cls in SELECTOR_KINDS.items())
+    selectors = [
+        [kinds[type(selector)], selector.raw]
+        for selector in rule.all_selectors]
+    return [selectors, list(rule.codes), rule._append_codes]
+
+
+def rule_from_json(value):
+    """Return the rule of a JSON value from `rule_to_json`."""
+    if value == AUTO_LINE_DISABLE_RULE:
+        return AutoLineDisableRule()
+
+    selectors, codes, append_codes = value
+    selectors = [
+        SELECTOR_KINDS[kind](_string(text)) for kind, text in selectors]
+    codes = ','.join(_string(code) for code in codes)
+    return Rule(selectors, '+' + codes if append_codes is True else codes)
+
+
+def load_rule_sets(cache_dir, key):
+    """Return the select and ignore `RuleSet` cached for key, or None."""
+    value = load(cache_dir, key)
+    if value is None:
+        return None
+    try:
+        select, ignore = [_rule_set_from_json(rule_set) for rule_set in value]
+    except Exception:
+        return None
+    return select, ignore
+
+
+def _rule_set_from_json(value):
+    parsed_rules = [rule_from_json(rule) for rule in value['parsed_rules']]
+    rules = [
+        parsed_rules[rule] if isinstance(rule, int) else rule_from_json(rule)
+        for rule in value['rules']]
+    return RuleSet(parsed_rules, folded_rules=rules)
+
+
+def dump_rule_sets(cache_dir, key, rule_sets):
+    """Cache the rule sets for key.
+
+    The rules of a rule set without an environment marker are the
+    parsed rules, so are cached as the index of the parsed rule.
+    """
+    values = []
+    for rule_set in rule_sets:
+        positions = dict(
+            (id(rule), index)
+            for index, rule in enumerate(rule_set.parsed_rules))
+        values.append({
+            'parsed_rules': [
+                rule_to_json(rule) for rule in rule_set.parsed_rules],
+            'rules': [
+                positions[id(rule)] if id(rule) in positions
+                else rule_to_json(rule)
+                for rule in rule_set.rules],
+        })
+    dump(cache_dir, key, values)
+
+
+class VerdictCache(object):
+
+    """Verdicts of the errors of each file, keyed by its name, content and rules.
+
+    The verdicts of a file are a tuple of (line number, code, ignored)
+    of each error in the order reported, as code selectors depend on
+    the codes reported earlier in the file.
+    """
+
+    def __init__(self, cache_dir, rules_key):
+        """Constructor."""
+        self.cache_dir = cache_dir
+        self.rules_key = rules_key
+
+    def key(self, filename, lines):
+        """Return the key of the file with lines.
+
+        File selectors decide which rules apply, so the key includes the
+        filename relative to the current directory.
+        """
+        if lines and isinstance(lines[0], bytes):
+            source = b''.join(lines)
+        else:
+            source = ''.join(lines).encode('utf-8', 'replace')
+        prefix = '\0'.join((self.rules_key, relative_filename(filename), ''))
+        return hashlib.sha1(
+            prefix.encode('utf-8', 'replace') + source).hexdigest()
+
+    def load(self, key):
+        """Return the verdicts cached for key, or None if not valid."""
+        value = load(self.cache_dir, key, VERDICT_PREFIX)
+        if not isinstance(value, list):
+            return None
+        verdicts = []
+        for verdict in value:
+            try:
+                line_number, code, ignored = verdict
+            except (TypeError, ValueError):
+                return None
+            if not (isinstance(line_number, int) and
+                    isinstance(code, type('')) and
+                    isinstance(ignored, bool)):
+                return None
+            verdicts.append((line_number, code, ignored))
+        return tuple(verdicts)
+
+    def dump(self, key, verdicts):
+        """Cache the verdicts for key."""
+        dump(self.cache_dir, key, [list(verdict) for verdict in verdicts],
+             VERDICT_PREFIX)
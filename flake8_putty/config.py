@@ -7,11 +7,6 @@ import os
 import re
 import sys
 
-try:
-    from packaging import markers
-except ImportError:
-    markers = None
-
 IS_WINDOWS = (sys.platform == 'win32')
 
 SELECTOR_SPLITTER = re.compile(r' *(/.*?(?<!\\)/|[^/][^,]*) *,?')
@@ -25,6 +20,65 @@ ENVIRONMENT_MARKER_PREFIXES = (
 )
 
 
+class RuleMatch(tuple):
+
+    """Matching rule and the codes it applies to the error."""
+
+    __slots__ = ()
+
+    def __new__(cls, rule, codes):
+        """Constructor."""
+        return tuple.__new__(cls, (rule, codes))
+
+    @property
+    def rule(self):
+        """Return the matching rule."""
+        return self[0]
+
+    @property
+    def codes(self):
+        """Return the codes applied to the error."""
+        return self[1]
+
+
+_markers = None
+
+
+def import_markers():
+    """Return module packaging.markers, or None if packaging is missing.
+
+    packaging is slow to import, so it is only imported when an
+    environment marker is used.
+    """
+    global _markers
+    if _markers is None:
+        try:
+            from packaging import markers
+        except ImportError:
+            markers = False
+        _markers = markers
+    return _markers or None
+
+
+def normalise_filename(filename):
+    """Return filename relative to '.' and using '/' separators."""
+    if filename.startswith('.' + os.sep):
+        filename = filename[len(os.sep) + 1:]
+    if os.sep != '/':
+        filename = filename.replace(os.sep, '/')
+    return filename
+
+
+def relative_filename(filename):
+    """Return filename relative to the current directory, using '/'."""
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        # On Windows, filename is on another drive
+        pass
+    return normalise_filename(filename)
+
+
 def _stripped_codes(codes):
     """Return a tuple of stripped codes split by ','."""
     return tuple([
@@ -72,6 +126,12 @@ class RegexSelector(Selector):
             self._compiled_regex = re.compile(self.raw)
         return self._compiled_regex
 
+    def __getstate__(self):
+        # Unpickling a compiled regex compiles it, which is left until used
+        state = self.__dict__.copy()
+        state['_compiled_regex'] = None
+        return state
+
 
 class FileSelector(Selector):
 
@@ -106,6 +166,7 @@ class EnvironmentMarkerSelector(Selector):
     def marker(self):
         """Return environment marker."""
         if not self._marker:
+            markers = import_markers()
             assert markers, 'Package packaging is needed for environment markers'
             self._marker = markers.Marker(self.raw)
         return self._marker
@@ -114,22 +175,66 @@ class EnvironmentMarkerSelector(Selector):
         """Evaluate the environment marker."""
         return self.marker.evaluate(environment)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_marker'] = None
+        return state
+
 
 class RuleBase(object):
 
     """Rule to be used for matching."""
 
     _append_codes = None
+    _vary_codes = False
+
+    file_selectors = ()
+    code_selectors = ()
+    regex_selectors = ()
+    environment_marker_selector = None
+
+    # Regex selectors only match comments, found by tokenizing the file
+    comments_only = False
 
     def __init__(self, selectors, codes):
         """Constructor."""
         self._selectors = selectors
         self.codes = codes
 
-    def match(self, filename, line, codes):
-        """Match rule."""
+    def applies_to_file(self, filename):
+        """Return whether the rule may match errors in the file."""
+        return True
+
+    def match_line(self, line, codes):
+        """Match rule against a line of a file it applies to.
+
+        Return a `RuleMatch` if the rule matches.
+        """
         # abstract method
 
+    def match(self, filename, line, codes):
+        """Match rule, returning a `RuleMatch` if it matches."""
+        return self.applies_to_file(filename) and self.match_line(line, codes)
+
+    def fold_environment_marker(self):
+        """Return rule without its environment marker, or None if false."""
+        marker = self.environment_marker_selector
+        if not marker:
+            return self
+
+        if not marker.evaluate():
+            return None
+
+        # Only imported when used, as few rules have markers
+        import copy
+
+        rule = copy.copy(self)
+        rule._selectors = [
+            selector for selector in self._selectors
+            if selector is not marker]
+        rule.environment_marker_selector = None
+        return rule
+
     def __repr__(self):
         return '<Rule %r : %r>' % (self._selectors, self.codes)
 
@@ -182,12 +287,12 @@ class RegexRule(RuleBase):
                     return True
         return False
 
-    def match(self, filename, line, codes):
-        """Match rule and set attribute codes."""
+    def match_line(self, line, codes):
+        """Match rule, with the codes matched by '(?P<codes>)' if used."""
         if self.regex_match_any(line, codes):
             if self._vary_codes:
-                self.codes = tuple([codes[-1]])
-            return True
+                return RuleMatch(self, (codes[-1], ))
+            return RuleMatch(self, self.codes)
 
 
 class Rule(RegexRule):
@@ -237,10 +342,7 @@ class Rule(RegexRule):
 
     def file_match_any(self, filename):
         """Match any filename."""
-        if filename.startswith('.' + os.sep):
-            filename = filename[len(os.sep) + 1:]
-        if os.sep != '/':
-            filename = filename.replace(os.sep, '/')
+        filename = normalise_filename(filename)
 
         for selector in self.file_selectors:
             if (selector.pattern.endswith('/') and
@@ -264,18 +366,31 @@ class Rule(RegexRule):
                 return True
         return False
 
-    def match(self, filename, line, codes):
-        """Match rule."""
-        if ((not self.file_selectors or self.file_match_any(filename)) and
+    def applies_to_file(self, filename):
+        """Match the file and environment marker selectors."""
+        return ((not self.file_selectors or self.file_match_any(filename)) and
                 (not self.environment_marker_selector or
-                 self.environment_marker_evaluate()) and
-                (not self.code_selectors or self.codes_match_any(codes))):
+                 self.environment_marker_evaluate()))
+
+    def match_line(self, line, codes):
+        """Match the code and regex selectors."""
+        if not self.code_selectors or self.codes_match_any(codes):
             if self.regex_selectors:
-                return super(Rule, self).match(filename, line, codes)
+                return super(Rule, self).match_line(line, codes)
             else:
-                return True
+                return RuleMatch(self, self.codes)
 
-        return False
+        return None
+
+
+def fold_environment_markers(rules):
+    """Return rules with environment markers evaluated.
+
+    The environment can not change while flake8 runs, so rules with
+    a false marker are dropped and true markers are removed.
+    """
+    rules = [rule.fold_environment_marker() for rule in rules]
+    return [rule for rule in rules if rule is not None]
 
 
 class Parser(object):
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty reference engine, matching each rule in turn."""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys
+
+from flake8_putty.extension import PuttyIgnoreCode
+from flake8_putty.ruleset import ignore_code
+
+
+def reference_codes(rules, codes, filename, line, seen_codes):
+    """Return codes with the codes of each matching rule applied.
+
+    Every rule is matched with `Rule.match`, in order, so later rules
+    replace or append to the codes of earlier rules.
+    """
+    for rule in rules:
+        match = rule.match(filename, line, seen_codes)
+        if match:
+            if rule._append_codes:
+                codes = codes + tuple(match.codes)
+            else:
+                codes = tuple(match.codes)
+    return codes
+
+
+class ReferenceIgnoreCode(PuttyIgnoreCode):
+
+    """`PuttyIgnoreCode` matching each rule with `Rule.match`.
+
+    This is the simplest implementation of the rules, without the
+    indexes and caches of the compiled rule sets.  Rules matching
+    only comments are matched against the whole line.
+    """
+
+    def reference_ignore_error(self, state, filename, line_number, code):
+        """Check if the error should be ignored, without side effects."""
+        try:
+            line = state.lines[line_number - 1]
+        except IndexError:
+            line = ''
+        seen_codes = sorted(state.seen_codes - set([code])) + [code]
+
+        code_sets = self.code_sets
+        ignore = reference_codes(
+            self.ignore_rules.parsed_rules, code_sets.codes[self.ignore_id],
+            filename, line, seen_codes)
+        select = reference_codes(
+            self.select_rules.parsed_rules, code_sets.codes[self.select_id],
+            filename, line, seen_codes)
+        return ignore_code(select, ignore, code)
+
+    def needs_lines(self, filename):
+        """Return True, as every rule is matched with the line."""
+        return True
+
+    def ignore_error(self, reporter, line_number, code):
+        """Check if the error code reported on the line should be ignored."""
+        state = self.file_state(reporter)
+        if state.baseline_file is not None and self.in_baseline(
+                state, line_number, code):
+            return True
+
+        ignored = self.reference_ignore_error(
+            state, reporter.filename, line_number, code)
+        if not ignored:
+            state.add_code(code)
+        return ignored
+
+
+class VerifyIgnoreCode(ReferenceIgnoreCode):
+
+    """`PuttyIgnoreCode` reporting errors where the engines differ.
+
+    Each error is decided by both the reference and compiled engines,
+    writing a message to stderr if they differ.  The verdict of the
+    compiled engine is used.
+    """
+
+    def ignore_error(self, reporter, line_number, code):
+        """Check if the error should be ignored, verifying the verdict."""
+        state = self.file_state(reporter)
+        if state.baseline_file is not None and self.in_baseline(
+                state, line_number, code):
+            return True
+
+        expected = self.reference_ignore_error(
+            state, reporter.filename, line_number, code)
+        ignored = PuttyIgnoreCode.ignore_error(
+            self, reporter, line_number, code)
+        if ignored != expected:
+            print(
+                'putty: engines differ for %s:%d %s: '
+                'reference ignored=%s, compiled ignored=%s' % (
+                    reporter.filename, line_number, code, expected, ignored),
+                file=sys.stderr)
+        return ignored
+
+
+ENGINES = {
+    'reference': ReferenceIgnoreCode,
+    'verify': VerifyIgnoreCode,
+}
@@ -1,72 +1,348 @@
 # -*- coding: utf-8 -*-
 """Flake8 putty extension."""
-from __future__ import absolute_import, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
 
 import functools
+import os
 import sys
 
 from flake8_putty.config import Parser, RegexRule, RegexSelector
+from flake8_putty.ruleset import ActiveRules, CodeSets, LRUCache, RuleSet
 
+# Errors reported by pep8 when a file can not be read or compiled
+READ_ERROR_CODES = ('E901', 'E902')
 
-# Copied from pep.StyleGuide.ignore_code
-def ignore_code(options, code):
-    """
-    Check if the error code should be ignored.
+# Default --putty-cache-size, in megabytes
+DEFAULT_CACHE_MEGABYTES = 64
+
+
+class FileState(object):
 
-    If 'options.select' contains a prefix of the error code,
-    return False.  Else, if 'options.ignore' contains a prefix of
-    the error code, return True.
+    """Rules and codes seen in the file being checked by a reporter."""
+
+    def __init__(self, hook, reporter):
+        """Constructor."""
+        self.lines = reporter.lines
+        self.ignore_rules = hook.ignore_rules.for_file(reporter.filename)
+        self.select_rules = hook.select_rules.for_file(reporter.filename)
+        self.ignore_active = ActiveRules(self.ignore_rules)
+        self.select_active = ActiveRules(self.select_rules)
+        self.seen_codes = set()
+        self._line_hits = {}
+        self._scan_hits = {}
+        self._comment_hits = {}
+
+        self.baseline_file = None
+        if hook.baseline is not None:
+            self.baseline_file = hook.baseline.file_key(reporter.filename)
+
+        # Verdicts of the errors in the file, if cached
+        self.verdicts = None
+        self.verdict_key = None
+        self._cached_verdicts = None
+        if hook.verdict_cache is not None:
+            self.verdicts = []
+            self.verdict_key = hook.verdict_cache.key(
+                reporter.filename, self.lines)
+            self._cached_verdicts = hook.verdict_cache.load(self.verdict_key)
+
+    def add_code(self, code):
+        """Add a code reported in the file."""
+        if code not in self.seen_codes:
+            self.seen_codes.add(code)
+            self.ignore_active.add_code(code)
+            self.select_active.add_code(code)
+
+    def cached_verdict(self, line_number, code):
+        """Return the cached verdict of the next error, or None.
+
+        Once an error differs from the cached errors, the later cached
+        verdicts are not used.
+        """
+        cached = self._cached_verdicts
+        if cached:
+            index = len(self.verdicts)
+            if (index < len(cached) and cached[index][0] == line_number and
+                    cached[index][1] == code):
+                return cached[index][2]
+            self._cached_verdicts = None
+        return None
+
+    def line_hits(self, file_rules, line_number):
+        """Get regex hits of line from a scan of the whole file."""
+        if not 0 < line_number <= len(self.lines):
+            return None
+
+        try:
+            file_line_hits = self._line_hits[file_rules]
+        except KeyError:
+            file_line_hits = self._line_hits[file_rules] = (
+                file_rules.scan_lines(self.lines))
+
+        return file_line_hits.get(line_number, {})
+
+    def scan_hits(self, file_rules, line_number, line, candidates):
+        """Get regex hits of line, scanning each line at most once.
+
+        The line is only scanned if a candidate rule has regex selectors,
+        and the hits are kept for later errors on the same line.
+        """
+        try:
+            file_scan_hits = self._scan_hits[file_rules]
+        except KeyError:
+            file_scan_hits = self._scan_hits[file_rules] = {}
+
+        hits = file_scan_hits.get(line_number)
+        if hits is None and not file_rules.regex_positions.isdisjoint(
+                candidates):
+            hits = file_scan_hits[line_number] = file_rules.matcher.scan(line)
+        return hits
+
+    def comment_hits(self, file_rules, line_number, line):
+        """Get comment hits of line from one tokenize pass of the file.
+
+        The file is only tokenized once an error is reported on a line
+        which a comment selector may match, so lines with other comments
+        cost one search of each selector.
+        """
+        if not file_rules.comment_matcher:
+            return None
+        if not file_rules.comment_matcher.may_match(line):
+            return {}
+
+        try:
+            file_comment_hits = self._comment_hits[file_rules]
+        except KeyError:
+            file_comment_hits = self._comment_hits[file_rules] = (
+                file_rules.scan_comments(self.lines))
+
+        return file_comment_hits.get(line_number, {})
+
+
+class PuttyIgnoreCode(object):
+
+    """pep8 'ignore_code' hook, given the reporter state by `report_error`.
+
+    The rules are compiled when the hook is created, and the decision
+    for each error neither modifies options nor the compiled rules.
     """
-    if len(code) < 4 and any(s.startswith(code)
-                             for s in options.select):
+
+    def __init__(self, options):
+        """Constructor."""
+        self.eager_scan = options.putty_eager_scan
+        self.ignore_rules = options.putty_ignore
+        self.select_rules = options.putty_select
+
+        self.code_sets = CodeSets()
+        self.ignore_id = self.code_sets.intern(options.ignore)
+        self.select_id = self.code_sets.intern(options.select)
+        self._skip_files = LRUCache()
+        # Seconds taken by `warm_rule_sets`, if used
+        self.warm_time = None
+        # `cache.VerdictCache`, if used
+        self.verdict_cache = None
+        # `baseline.Baseline` of errors to ignore, if used
+        self.baseline = None
+
+    def __call__(self, code):
+        """Return False, as `report_error` has already checked the code."""
         return False
-    return (code.startswith(options.ignore) and
-            not code.startswith(options.select))
-
-
-def get_reporter_state():
-    """Get pep8 reporter state from stack."""
-    # Stack
-    # 1. get_reporter_state (i.e. this function)
-    # 2. putty_ignore_code
-    # 3. QueueReport.error or pep8.StandardReport.error for flake8 -j 1
-    # 4. pep8.Checker.check_ast or check_physical or check_logical
-    #    locals contains `tree` (ast) for check_ast
-    frame = sys._getframe(3)
-    reporter = frame.f_locals['self']
-    line_number = frame.f_locals['line_number']
-    offset = frame.f_locals['offset']
-    text = frame.f_locals['text']
-    check = frame.f_locals['check']
-    return reporter, line_number, offset, text, check
-
-
-def putty_ignore_code(options, code):
-    """Implement pep8 'ignore_code' hook."""
-    reporter, line_number, offset, text, check = get_reporter_state()
-    try:
-        line = reporter.lines[line_number - 1]
-    except IndexError:
-        line = ''
-
-    options.ignore = options._orig_ignore
-    options.select = options._orig_select
-
-    for rule in options.putty_ignore:
-        if rule.match(reporter.filename, line, list(reporter.counters) + [code]):
-            if rule._append_codes:
-                options.ignore = options.ignore + rule.codes
-            else:
-                options.ignore = rule.codes
-
-    for rule in options.putty_select:
-        if rule.match(reporter.filename, line, list(reporter.counters) + [code]):
-            if rule._append_codes:
-                options.select = options.select + rule.codes
-            else:
-                options.select = rule.codes
-
-    return ignore_code(options, code)
+
+    def file_state(self, reporter):
+        """Return the `FileState` of the file being checked by reporter."""
+        state = getattr(reporter, '_putty_file', None)
+        if state is None or state.lines is not reporter.lines:
+            state = reporter._putty_file = FileState(self, reporter)
+        return state
+
+    def ignore_error(self, reporter, line_number, code):
+        """Check if the error code reported on the line should be ignored.
+
+        Codes not ignored are added to the codes seen in the file.
+        """
+        state = self.file_state(reporter)
+        if state.baseline_file is not None and self.in_baseline(
+                state, line_number, code):
+            return True
+
+        if state.verdicts is None:
+            ignored = self._ignore_error(state, line_number, code)
+        else:
+            ignored = state.cached_verdict(line_number, code)
+            if ignored is None:
+                ignored = self._ignore_error(state, line_number, code)
+            state.verdicts.append((line_number, code, ignored))
+
+        if not ignored:
+            state.add_code(code)
+        return ignored
+
+    def _ignore_error(self, state, line_number, code):
+        try:
+            line = state.lines[line_number - 1]
+        except IndexError:
+            line = ''
+
+        code_sets = self.code_sets
+
+        file_rules = state.ignore_rules
+        candidates = state.ignore_active.candidates(code)
+        if self.eager_scan:
+            hits = state.line_hits(file_rules, line_number)
+        else:
+            hits = state.scan_hits(file_rules, line_number, line, candidates)
+        ignore_id = file_rules.apply(
+            code_sets, self.ignore_id, line, code, candidates, hits,
+            state.comment_hits(file_rules, line_number, line))
+
+        file_rules = state.select_rules
+        candidates = state.select_active.candidates(code)
+        if self.eager_scan:
+            hits = state.line_hits(file_rules, line_number)
+        else:
+            hits = state.scan_hits(file_rules, line_number, line, candidates)
+        select_id = file_rules.apply(
+            code_sets, self.select_id, line, code, candidates, hits,
+            state.comment_hits(file_rules, line_number, line))
+
+        return code_sets.ignore_code(select_id, ignore_id, code)
+
+    def in_baseline(self, state, line_number, code):
+        """Check if the error is in the baseline, whatever its line number."""
+        try:
+            line = state.lines[line_number - 1]
+        except IndexError:
+            line = ''
+        return self.baseline.ignores(state.baseline_file, code, line)
+
+    def end_file(self, reporter):
+        """Cache the verdicts of the file checked by reporter, if changed."""
+        state = getattr(reporter, '_putty_file', None)
+        if state is None or not state.verdicts:
+            return
+        if state.verdicts != list(state._cached_verdicts or ()):
+            self.verdict_cache.dump(state.verdict_key, state.verdicts)
+        state.verdicts = None
+
+    def needs_lines(self, filename):
+        """Check if the baseline or the rules applicable to the file match lines."""
+        return (self.baseline is not None or
+                self.ignore_rules.for_file(filename).reads_lines or
+                self.select_rules.for_file(filename).reads_lines)
+
+    def skip_file(self, filename):
+        """Check if every error which may be reported in the file is ignored.
+
+        Only rules applying to every error in the file may ignore codes,
+        and every rule which may select codes is assumed to apply.
+        """
+        ignore_rules = self.ignore_rules.for_file(filename)
+        select_rules = self.select_rules.for_file(filename)
+        key = (ignore_rules, select_rules)
+        skip = self._skip_files.get(key)
+        if skip is None:
+            skip = self._skip_files[key] = self._ignores_all_codes(
+                ignore_rules, select_rules)
+        return skip
+
+    def _ignores_all_codes(self, ignore_rules, select_rules):
+        code_sets = self.code_sets
+        ignore_id = ignore_rules.unconditional_codes(
+            code_sets, self.ignore_id)
+        select_id = select_rules.possible_codes(code_sets, self.select_id)
+        if ignore_id is None or select_id is None:
+            return False
+
+        # As pep8 StyleGuide.get_checks, a check without a code always runs
+        return all(
+            code and code_sets.ignore_code(select_id, ignore_id, code)
+            for code in reported_codes()
+        )
+
+
+def reported_codes():
+    """Return the codes of all pep8 checks, and of errors reading a file."""
+    from flake8.engine import pep8
+
+    codes = set(READ_ERROR_CODES)
+    for checks in pep8._checks.values():
+        for check_codes, args in checks.values():
+            codes.update(check_codes)
+    return codes
+
+
+def wrap_report_error(error):
+    """Return wrapper of pep8 BaseReport.error calling `PuttyIgnoreCode`.
+
+    All pep8 and flake8 reports pass errors to BaseReport.error, and
+    the wrapper gives the line number of the error to putty directly.
+    Reports of style guides without putty are not affected.
+    """
+    @functools.wraps(error)
+    def report_error(self, line_number, offset, text, check):
+        ignore_code = self._ignore_code
+        if (isinstance(ignore_code, PuttyIgnoreCode) and
+                ignore_code.ignore_error(self, line_number, text[:4])):
+            return None
+        return error(self, line_number, offset, text, check)
+
+    report_error.putty_wrapped = error
+    return report_error
+
+
+def wrap_excluded(excluded):
+    """Return wrapper of pep8 StyleGuide.excluded calling `PuttyIgnoreCode`.
+
+    Files are also excluded when putty ignores every error which may be
+    reported in them, so they are not checked at all.
+    """
+    @functools.wraps(excluded)
+    def putty_excluded(self, filename, parent=None):
+        if excluded(self, filename, parent):
+            return True
+
+        ignore_code = self.options.ignore_code
+        if not isinstance(ignore_code, PuttyIgnoreCode):
+            return False
+
+        if parent:
+            filename = os.path.join(parent, filename)
+        return (ignore_code.skip_file(filename) and
+                not os.path.isdir(filename))
+
+    putty_excluded.putty_wrapped = excluded
+    return putty_excluded
+
+
+def wrap_check_all(check_all):
+    """Return wrapper of pep8 Checker.check_all calling `PuttyIgnoreCode`.
+
+    The verdicts of the errors of each file are cached once all errors
+    of the file have been reported.
+    """
+    @functools.wraps(check_all)
+    def putty_check_all(self, *args, **kwargs):
+        result = check_all(self, *args, **kwargs)
+        ignore_code = getattr(self.report, '_ignore_code', None)
+        if (isinstance(ignore_code, PuttyIgnoreCode) and
+                ignore_code.verdict_cache is not None):
+            ignore_code.end_file(self.report)
+        return result
+
+    putty_check_all.putty_wrapped = check_all
+    return putty_check_all
+
+
+def install_hooks():
+    """Wrap pep8 BaseReport.error, StyleGuide.excluded and Checker.check_all, once."""
+    from flake8.engine import pep8
+
+    if not hasattr(pep8.BaseReport.error, 'putty_wrapped'):
+        pep8.BaseReport.error = wrap_report_error(pep8.BaseReport.error)
+    if not hasattr(pep8.StyleGuide.excluded, 'putty_wrapped'):
+        pep8.StyleGuide.excluded = wrap_excluded(pep8.StyleGuide.excluded)
+    if not hasattr(pep8.Checker.check_all, 'putty_wrapped'):
+        pep8.Checker.check_all = wrap_check_all(pep8.Checker.check_all)
 
 
 class AutoLineDisableSelector(RegexSelector):
@@ -83,6 +359,8 @@ class AutoLineDisableRule(RegexRule):
 
     """Rule matching # flake8: disable=x,y ."""
 
+    comments_only = True
+
     def __init__(self):
         """Constructor."""
         super(AutoLineDisableRule, self).__init__(
@@ -95,6 +373,98 @@ class AutoLineDisableRule(RegexRule):
         return 'AutoLineDisableRule()'
 
 
+def rules_cache_key(options, *values):
+    """Return the cache key of the putty rules of the options and values."""
+    from flake8_putty import cache
+
+    return cache.cache_key(
+        PuttyExtension.version,
+        options.putty_select,
+        options.putty_ignore,
+        options.putty_auto_ignore,
+        *values
+    )
+
+
+def verdict_cache(options, baseline=None):
+    """Return the `cache.VerdictCache` of the options, pruning the cache.
+
+    Verdicts also depend on the flake8 select and ignore options, and
+    on the baseline, which decides the codes seen in each file.
+    """
+    from flake8_putty import cache
+
+    cache_dir = options.putty_cache_dir
+    cache.prune(cache_dir, options.putty_cache_size * 1024 * 1024)
+    return cache.VerdictCache(
+        cache_dir,
+        rules_cache_key(
+            options, tuple(options.select), tuple(options.ignore),
+            baseline.digest if baseline else None),
+    )
+
+
+def load_baseline(options):
+    """Return the `baseline.Baseline` of the options, or None."""
+    if not options.putty_baseline:
+        return None
+
+    # Only imported when used, as hashlib is slow to import
+    from flake8_putty import baseline
+
+    return baseline.load(options.putty_baseline)
+
+
+def compile_rule_sets(options):
+    """Return the select and ignore `RuleSet` of the options.
+
+    If a cache directory is given, the rule sets are loaded from the
+    cache entry of the option values, or compiled and cached.
+    """
+    cache_dir = options.putty_cache_dir
+    if cache_dir:
+        # Only imported when used, as hashlib is slow to import
+        from flake8_putty import cache
+
+        key = rules_cache_key(options)
+        rule_sets = cache.load_rule_sets(cache_dir, key)
+        if rule_sets is not None:
+            return rule_sets
+
+    select_rules = Parser(options.putty_select)._rules
+    ignore_rules = Parser(options.putty_ignore)._rules
+
+    if options.putty_auto_ignore:
+        ignore_rules.append(AutoLineDisableRule())
+
+    rule_sets = RuleSet(select_rules), RuleSet(ignore_rules)
+
+    if cache_dir:
+        cache.dump_rule_sets(cache_dir, key, rule_sets)
+
+    return rule_sets
+
+
+def warm_rule_sets(options):
+    """Compile the select and ignore rule sets, returning the time taken.
+
+    When flake8 forks processes for --jobs, they share the compiled
+    rules instead of each compiling them.  Objects existing after the
+    rules are compiled are frozen, where supported, so the garbage
+    collector of each process does not copy the shared memory.
+    """
+    # Only imported when used, as putty-warm is rarely set
+    import gc
+    import time
+
+    start = time.time()
+    options.putty_select.warm()
+    options.putty_ignore.warm()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    return time.time() - start
+
+
 class PuttyExtension(object):
 
     """Flake8 extension for customising error reporting."""
@@ -129,29 +499,102 @@ class PuttyExtension(object):
             help=('auto ignore lines matching '
                   '# flake8: disable=<code>,<code>'),
         )
+        parser.add_option(
+            '--putty-eager-scan', action='store_true',
+            dest='putty_eager_scan', default=False,
+            help=('scan each file once for all regex selectors, instead of '
+                  'each line with errors'),
+        )
+        parser.add_option(
+            '--putty-cache-dir', metavar='dir', default='',
+            help='directory to cache the compiled putty rules',
+        )
+        parser.add_option(
+            '--putty-cache-size', metavar='megabytes', type='int',
+            default=DEFAULT_CACHE_MEGABYTES,
+            help=('maximum size of the putty cache, removing the least '
+                  'recently used entries (default: %default)'),
+        )
+        parser.add_option(
+            '--putty-baseline', metavar='path', default='',
+            help=('file of existing errors to ignore, written by '
+                  'python -m flake8_putty baseline'),
+        )
+        parser.add_option(
+            '--putty-warm', action='store_true',
+            dest='putty_warm', default=False,
+            help=('compile all putty rules before checking files, to be '
+                  'shared by --jobs processes, and exclude all objects then '
+                  'existing from garbage collection (gc.freeze, where '
+                  'supported)'),
+        )
+        parser.add_option(
+            '--putty-engine', metavar='engine', type='choice',
+            choices=['compiled', 'reference', 'verify'], default='compiled',
+            help=('putty rule engine: compiled (default), reference or '
+                  'verify, which reports errors where they differ'),
+        )
+        parser.add_option(
+            '--putty-stats', metavar='format', type='choice',
+            choices=['table', 'json'], default=None,
+            help=('print evaluations, matches and time spent of each putty '
+                  'rule, as a table or json; rules are timed with Rule.match '
+                  'of each rule, and errors decided by the compiled engine, '
+                  'so --putty-engine is not used'),
+        )
         parser.config_options.append('putty-select')
         parser.config_options.append('putty-ignore')
         parser.config_options.append('putty-auto-ignore')
+        parser.config_options.append('putty-eager-scan')
+        parser.config_options.append('putty-cache-dir')
+        parser.config_options.append('putty-cache-size')
+        parser.config_options.append('putty-baseline')
+        parser.config_options.append('putty-warm')
+        parser.config_options.append('putty-engine')
+        parser.config_options.append('putty-stats')
 
     @classmethod
     def parse_options(cls, options):
         """Parse options and activate `ignore_code` handler."""
         if (not options.putty_select and not options.putty_ignore and
-                not options.putty_auto_ignore):
+                not options.putty_auto_ignore and not options.putty_baseline):
             return
 
-        options._orig_select = options.select
-        options._orig_ignore = options.ignore
+        baseline = load_baseline(options)
+        verdicts = None
+        if options.putty_cache_dir and options.putty_engine == 'compiled':
+            verdicts = verdict_cache(options, baseline)
 
-        options.putty_select = Parser(options.putty_select)._rules
-        options.putty_ignore = Parser(options.putty_ignore)._rules
+        options.putty_select, options.putty_ignore = compile_rule_sets(
+            options)
 
-        if options.putty_auto_ignore:
-            options.putty_ignore.append(AutoLineDisableRule())
+        install_hooks()
 
-        options.ignore_code = functools.partial(
-            putty_ignore_code,
-            options,
-        )
+        if options.putty_stats:
+            # Only imported when used, so rules are not instrumented otherwise
+            import atexit
+
+            from flake8_putty.stats import StatsIgnoreCode, print_stats
+
+            if options.putty_engine != 'compiled':
+                print('putty: --putty-stats uses the compiled engine, '
+                      'ignoring --putty-engine=%s' % options.putty_engine,
+                      file=sys.stderr)
+            options.ignore_code = StatsIgnoreCode(options)
+            atexit.register(print_stats, options, options.putty_stats)
+        elif options.putty_engine != 'compiled':
+            from flake8_putty.engine import ENGINES
 
+            options.ignore_code = ENGINES[options.putty_engine](options)
+        else:
+            options.ignore_code = PuttyIgnoreCode(options)
+
+        options.ignore_code.verdict_cache = verdicts
+        options.ignore_code.baseline = baseline
         options.report._ignore_code = options.ignore_code
+
+        if options.putty_warm:
+            options.ignore_code.warm_time = warm_rule_sets(options)
+            if options.verbose:
+                print('putty rules compiled in %.3f seconds' %
+                      options.ignore_code.warm_time)
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty filter of existing flake8 reports."""
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import functools
+import io
+import mmap
+import multiprocessing
+import re
+import sys
+import tokenize
+import warnings
+
+from flake8_putty.extension import PuttyIgnoreCode
+from flake8_putty.ruleset import LRUCache
+
+# Source files whose lines are kept while filtering
+DEFAULT_FILE_CACHE_SIZE = 16
+
+# Batches of records queued for each --jobs process
+BATCHES_PER_JOB = 4
+
+# flake8 default format, '%(path)s:%(row)d:%(col)d: %(code)s %(text)s'
+RECORD = re.compile(
+    r'(?P<filename>.+?):(?P<line_number>\d+):(?:\d+:)? (?P<code>[A-Z]+\d+)\b')
+
+
+def _detect_encoding(first_lines):
+    """Return the source encoding declared in the first lines, as pep8."""
+    if sys.version_info[0] < 3:
+        # pep8 checks the undecoded lines
+        return None
+    readline = functools.partial(next, iter(first_lines), b'')
+    try:
+        return tokenize.detect_encoding(readline)[0]
+    except (LookupError, SyntaxError):
+        return 'latin-1'
+
+
+class MappedLines(object):
+
+    """Lines of a memory-mapped source file, decoded as they are accessed.
+
+    Newlines are only found as far as the lines accessed, so the lines
+    are a sequence like the list of `pep8.readlines`, without reading or
+    decoding the rest of the file.  A missing or empty file has no lines.
+    """
+
+    def __init__(self, filename):
+        """Constructor."""
+        try:
+            with open(filename, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            self._data = b''
+        self._offsets = [0]
+        self._indexed = False
+        self._encoding = _detect_encoding(
+            [self._raw_line(0), self._raw_line(1)])
+
+    def _index(self, count=None):
+        """Find the offsets of the first count lines, or of all lines."""
+        data = self._data
+        offsets = self._offsets
+        while not self._indexed and (count is None or len(offsets) <= count):
+            end = data.find(b'\n', offsets[-1])
+            if end >= 0:
+                offsets.append(end + 1)
+            else:
+                if offsets[-1] < len(data):
+                    offsets.append(len(data))
+                self._indexed = True
+
+    def _raw_line(self, index):
+        self._index(index + 1)
+        if index + 1 >= len(self._offsets):
+            return b''
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+    def __len__(self):
+        self._index()
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        self._index(index + 1)
+        if not 0 <= index < len(self._offsets) - 1:
+            raise IndexError(index)
+
+        line = self._raw_line(index)
+        if self._encoding is None:
+            return line
+        try:
+            line = line.decode(self._encoding)
+        except UnicodeError:
+            line = line.decode('latin-1')
+        # As universal newlines of pep8.readlines
+        if line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+        return line
+
+    def __iter__(self):
+        index = 0
+        while True:
+            try:
+                line = self[index]
+            except IndexError:
+                return
+            yield line
+            index += 1
+
+
+class SourceReport(object):
+
+    """Reporter state of a source file named in a report.
+
+    The file is not opened if read_lines is False.
+    """
+
+    def __init__(self, filename, read_lines=True):
+        """Constructor."""
+        self.filename = filename
+        self.lines = MappedLines(filename) if read_lines else ()
+        self.counters = {}
+
+
+class ReportFilter(object):
+
+    """Filter flake8 report records with the putty rules of flake8 options.
+
+    The most recently reported source files are kept memory-mapped, so
+    a report is filtered as a stream with bounded memory.  As in flake8,
+    code selectors match the codes of the file seen so far, which are
+    in the order of the report.
+    """
+
+    def __init__(self, options, cache_size=DEFAULT_FILE_CACHE_SIZE):
+        """Constructor."""
+        self.ignore_code = options.ignore_code
+        if isinstance(self.ignore_code, PuttyIgnoreCode):
+            # Verdicts are cached by the content of whole files
+            self.ignore_code.verdict_cache = None
+        self._sources = LRUCache(cache_size)
+
+    def source(self, filename):
+        """Return the `SourceReport` of a file.
+
+        The file is only read if a regex selector may match its lines.
+        """
+        source = self._sources.get(filename)
+        if source is None:
+            source = self._sources[filename] = SourceReport(
+                filename, self.ignore_code.needs_lines(filename))
+        return source
+
+    def ignore_record(self, filename, line_number, code):
+        """Check if the error of a record should be ignored."""
+        if isinstance(self.ignore_code, PuttyIgnoreCode):
+            return self.ignore_code.ignore_error(
+                self.source(filename), line_number, code)
+        return self.ignore_code(code)
+
+    def filter(self, records):
+        """Yield records which are not ignored, and lines which are not records."""
+        for record in records:
+            match = RECORD.match(record)
+            if not match or not self.ignore_record(
+                    match.group('filename'),
+                    int(match.group('line_number')),
+                    match.group('code')):
+                yield record
+
+
+def batch_records(records):
+    """Yield lists of consecutive records of the same file.
+
+    Lines which are not records are in the batch of the preceding record.
+    """
+    batch = []
+    filename = None
+    for record in records:
+        match = RECORD.match(record)
+        if match:
+            if filename not in (None, match.group('filename')):
+                yield batch
+                batch = []
+            filename = match.group('filename')
+        batch.append(record)
+    if batch:
+        yield batch
+
+
+_worker_filter = None
+
+
+def _init_worker(report_filter):
+    global _worker_filter
+    _worker_filter = report_filter
+
+
+def _filter_batch(batch):
+    return list(_worker_filter.filter(batch))
+
+
+def parallel_filter(pool, jobs, records):
+    """Yield records which are not ignored, filtered by a pool of processes.
+
+    Each batch of records of a file is filtered by one process, so the
+    file is read once if flake8 reported its errors together, as it does
+    with and without --jobs.  Records are yielded in the order read, and
+    only a few batches for each process are read ahead.
+    """
+    pending = collections.deque()
+    for batch in batch_records(records):
+        pending.append(pool.apply_async(_filter_batch, (batch, )))
+        if len(pending) >= jobs * BATCHES_PER_JOB:
+            for record in pending.popleft().get():
+                yield record
+    while pending:
+        for record in pending.popleft().get():
+            yield record
+
+
+def job_count(jobs):
+    """Return the number of processes for the flake8 --jobs option."""
+    if not jobs:
+        return 1
+    if isinstance(jobs, int):
+        return jobs
+    if jobs.isdigit():
+        return int(jobs)
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def get_style_guide(args, default_path='-'):
+    """Return the flake8 style guide of options and paths parsed from args.
+
+    default_path is added if args has no paths, and is stdin by default.
+    """
+    from flake8 import engine
+
+    # The flake8 parser knows which options take a value
+    argv = ['flake8'] + list(args)
+    if not engine.get_parser()[0].parse_args(list(args))[1]:
+        argv.append(default_path)
+
+    orig_argv = sys.argv
+    sys.argv = argv
+    try:
+        # flake8 warns that --jobs is ignored for stdin, which is used here
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            style_guide = engine.get_style_guide(parse_argv=True)
+    finally:
+        sys.argv = orig_argv
+    return style_guide
+
+
+def get_options(args, default_path='-'):
+    """Return flake8 options and paths, parsed from args by flake8."""
+    style_guide = get_style_guide(args, default_path)
+    return style_guide.options, style_guide.paths
+
+
+def filter_main(args, stdin=None, stdout=None):
+    """Write the records of flake8 reports which are not ignored.
+
+    args are flake8 options and report paths, with '-' or no paths
+    for stdin.  Records are filtered by --jobs processes.
+    Return 1 if any record is written.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    options, paths = get_options(args)
+    report_filter = ReportFilter(options)
+
+    jobs = job_count(getattr(options, 'jobs', None))
+    pool = None
+    if jobs > 1:
+        # Forked processes share the compiled rules of this process
+        pool = multiprocessing.Pool(jobs, _init_worker, (report_filter, ))
+
+    status = 0
+    try:
+        for path in paths:
+            if path == '-':
+                stream = stdin
+            else:
+                stream = io.open(path, encoding='utf-8', errors='replace')
+            try:
+                if pool:
+                    records = parallel_filter(pool, jobs, stream)
+                else:
+                    records = report_filter.filter(stream)
+                for record in records:
+                    stdout.write(record)
+                    if not status and RECORD.match(record):
+                        status = 1
+            finally:
+                if stream is not stdin:
+                    stream.close()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    return status
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty compiled rule sets."""
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import fnmatch
+import functools
+import os
+import re
+import threading
+import tokenize
+
+from flake8_putty.config import (
+    _stripped_codes,
+    fold_environment_markers,
+    normalise_filename,
+)
+
+DEFAULT_CACHE_SIZE = 256
+
+# Python 2 limits a regex to 100 groups
+MAX_COMBINED_SELECTORS = 90
+
+_GLOB_CHARS = re.compile(r'[*?[]')
+
+# fnmatch normalises the case of both filename and pattern
+_IGNORE_FILENAME_CASE = os.path.normcase('A') != 'A'
+
+# Patterns which match differently within the whole source, as anchors
+# and lookarounds may see the neighbouring lines
+_LINE_ONLY_REGEX = re.compile(r'\\[AZ]|\(\?[<=!]')
+
+# Patterns which may match a comment but not the line containing it
+_COMMENT_ONLY_REGEX = re.compile(r'\\[AZbB]|\(\?[<=!]|[$^]')
+
+
+def _match_hit(regex, match):
+    """Return True or the codes captured by a match of the regex."""
+    if match.lastindex and 'codes' in regex.groupindex:
+        codes = match.group('codes')
+        return set(_stripped_codes(codes)) if codes else set()
+    return True
+
+
+def _add_hit(hits, index, hit):
+    """Merge the hit of a rule into hits."""
+    if hit is True:
+        hits[index] = True
+    elif hits.get(index) is not True:
+        hits.setdefault(index, set()).update(hit)
+
+
+class _InsertionOrder(object):
+
+    """Mapping remembering the order of insertion, for Python 2.6.
+
+    Only the methods used by `LRUCache` are provided.  The oldest entry
+    is found by a search, which is only needed once the cache is full.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._data = {}
+        self._count = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __setitem__(self, key, value):
+        self._count += 1
+        self._data[key] = (self._count, value)
+
+    def pop(self, key, *default):
+        """Remove key, returning its value or default."""
+        if default and key not in self._data:
+            return default[0]
+        return self._data.pop(key)[1]
+
+    def popitem(self, last=True):
+        """Remove the newest entry, or the oldest if last is False."""
+        data = self._data
+        find = max if last else min
+        key = find(data, key=lambda key: data[key][0])
+        return key, data.pop(key)[1]
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+
+
+# collections.OrderedDict was added in Python 2.7
+_OrderedDict = getattr(collections, 'OrderedDict', _InsertionOrder)
+
+
+class LRUCache(object):
+
+    """Mapping of bounded size, evicting the least recently used entry.
+
+    The cache may be shared by threads.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """Constructor."""
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self._data = _OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return value for key, marking it as recently used."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __getstate__(self):
+        # Entries are not pickled
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'])
+
+
+# Copied from pep.StyleGuide.ignore_code
+def ignore_code(select, ignore, code):
+    """
+    Check if the error code should be ignored.
+
+    If 'select' contains a prefix of the error code,
+    return False.  Else, if 'ignore' contains a prefix of
+    the error code, return True.
+    """
+    if len(code) < 4 and any(s.startswith(code)
+                             for s in select):
+        return False
+    return (code.startswith(ignore) and
+            not code.startswith(select))
+
+
+class CodeSets(object):
+
+    """Interned tuples of codes, with cached `ignore_code` verdicts.
+
+    Each distinct tuple of codes is identified by an int, and appending
+    codes to an interned tuple is memoised, so the select and ignore
+    codes of an error are found and compared without building or
+    hashing tuples once the combination has been seen.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.codes = []
+        self._ids = {}
+        self._appended = {}
+        self._verdicts = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def intern(self, codes):
+        """Return the id of a tuple of codes."""
+        codes = tuple(codes)
+        with self._lock:
+            codes_id = self._ids.get(codes)
+            if codes_id is None:
+                codes_id = self._ids[codes] = len(self.codes)
+                self.codes.append(codes)
+            return codes_id
+
+    def append(self, codes_id, codes):
+        """Return the id of the codes of codes_id followed by codes."""
+        key = (codes_id, codes)
+        try:
+            return self._appended[key]
+        except KeyError:
+            appended_id = self._appended[key] = self.intern(
+                self.codes[codes_id] + codes)
+            return appended_id
+
+    def ignore_code(self, select_id, ignore_id, code):
+        """Check if the error code should be ignored, using interned codes."""
+        key = (select_id, ignore_id, code)
+        try:
+            return self._verdicts[key]
+        except KeyError:
+            verdict = self._verdicts[key] = ignore_code(
+                self.codes[select_id], self.codes[ignore_id], code)
+            return verdict
+
+
+def _translate_glob(pattern):
+    """Return fnmatch pattern translated to a regex usable within a group."""
+    regex = fnmatch.translate(pattern)
+    # Python 2 appends the global flags, which are not needed for filenames
+    if regex.endswith('(?ms)'):
+        regex = regex[:-len('(?ms)')]
+    return regex
+
+
+class FileMatcher(object):
+
+    """Match the file selectors of many rules with one lookup of a filename.
+
+    Directory patterns, ending with '/', are stored in a trie of path
+    components to find every directory prefix of a filename.  Patterns
+    without glob characters are looked up in a dict, and the remaining
+    glob patterns are combined into regexes of at most
+    `MAX_COMBINED_SELECTORS` patterns.
+    """
+
+    _INDEXES = None
+
+    def __init__(self, rules):
+        """Constructor."""
+        self._tree = {}
+        self._exact = {}
+        globs = []
+
+        for index, rule in rules:
+            for selector in rule.file_selectors:
+                pattern = selector.pattern
+                if pattern.endswith('/'):
+                    node = self._tree
+                    for component in pattern[:-1].split('/'):
+                        node = node.setdefault(component, {})
+                    node.setdefault(self._INDEXES, set()).add(index)
+
+                if _GLOB_CHARS.search(pattern):
+                    globs.append((index, pattern))
+                else:
+                    if _IGNORE_FILENAME_CASE:
+                        pattern = pattern.lower()
+                    self._exact.setdefault(pattern, set()).add(index)
+
+        # Each glob is a group, so the globs are combined in chunks
+        flags = re.IGNORECASE if _IGNORE_FILENAME_CASE else 0
+        self._glob_regexes = []
+        for start in range(0, len(globs), MAX_COMBINED_SELECTORS):
+            chunk = globs[start:start + MAX_COMBINED_SELECTORS]
+            regex = re.compile(''.join(
+                '(?:(?=(?P<_f%d>%s))|)' % (i, _translate_glob(pattern))
+                for i, (index, pattern) in enumerate(chunk)
+            ), flags)
+            indexes = tuple([index for index, pattern in chunk])
+            self._glob_regexes.append((regex, indexes))
+
+    def match(self, filename):
+        """Return the set of indexes of rules matching the filename."""
+        filename = normalise_filename(filename)
+
+        key = filename.lower() if _IGNORE_FILENAME_CASE else filename
+        indexes = set(self._exact.get(key, ()))
+
+        node = self._tree
+        for component in filename.split('/')[:-1]:
+            node = node.get(component)
+            if node is None:
+                break
+            indexes.update(node.get(self._INDEXES, ()))
+
+        for regex, glob_indexes in self._glob_regexes:
+            groups = regex.match(filename).groups()
+            for index, group in zip(glob_indexes, groups):
+                if group is not None:
+                    indexes.add(index)
+
+        return indexes
+
+
+class RegexMatcher(object):
+
+    """Match the regex selectors of many rules with one scan of a line.
+
+    Each selector is searched for with its own regex, which is faster
+    than a combined regex as the literal prefix of each is found by a
+    fast search.  Selectors capturing ``(?P<codes>)`` find every match
+    in the line, to collect all of the codes.
+
+    The result of `scan` maps the index of each matching rule to
+    True, if the rule matched any code, or to the set of codes
+    captured from the line.
+    """
+
+    def __init__(self, rules):
+        """Constructor."""
+        self._selectors = []
+        self._plain = []
+        self._codes = []
+
+        for index, rule in rules:
+            for selector in rule.regex_selectors:
+                regex = selector.regex
+                self._selectors.append((index, regex))
+                if regex.groups and 'codes' in regex.groupindex:
+                    self._codes.append((index, regex))
+                else:
+                    self._plain.append((index, regex))
+
+    def scan(self, line):
+        """Return a dict of rule index to matched codes."""
+        hits = {}
+        for index, regex in self._plain:
+            if index not in hits and regex.search(line):
+                hits[index] = True
+
+        for index, regex in self._codes:
+            if hits.get(index) is True:
+                continue
+            for match in regex.finditer(line):
+                hit = _match_hit(regex, match)
+                if hit:
+                    _add_hit(hits, index, hit)
+                    if hit is True:
+                        break
+        return hits
+
+    def scan_lines(self, lines):
+        """Return a dict of line number to `scan` result for all lines.
+
+        Each regex is run once over the whole source in MULTILINE mode,
+        using an index of line offsets to find the line of each match.
+        Lines without any match are omitted.
+        """
+        source = ''.join(lines)
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line))
+
+        line_hits = {}
+        for index, regex in self._selectors:
+            if (regex.flags & re.DOTALL or
+                    _LINE_ONLY_REGEX.search(regex.pattern)):
+                rescan = range(len(lines))
+            else:
+                rescan = self._scan_source(
+                    index, regex, source, offsets, line_hits)
+
+            # Matches spanning lines are verified line by line
+            for i in rescan:
+                for match in regex.finditer(lines[i]):
+                    hit = _match_hit(regex, match)
+                    if hit:
+                        _add_hit(line_hits.setdefault(i + 1, {}), index, hit)
+        return line_hits
+
+    @staticmethod
+    def _scan_source(index, regex, source, offsets, line_hits):
+        """Add hits of regex in source, returning lines needing a rescan."""
+        # Only imported when used, by putty-eager-scan
+        import bisect
+
+        multiline_regex = re.compile(regex.pattern, regex.flags | re.MULTILINE)
+        last_line = len(offsets) - 2
+        rescan = set()
+        for match in multiline_regex.finditer(source):
+            i = bisect.bisect_right(offsets, match.start()) - 1
+            if i > last_line:
+                break
+            if match.end() > offsets[i + 1]:
+                end = bisect.bisect_left(offsets, match.end()) - 1
+                rescan.update(range(i, min(end, last_line) + 1))
+                continue
+            hit = _match_hit(multiline_regex, match)
+            if hit:
+                _add_hit(line_hits.setdefault(i + 1, {}), index, hit)
+        return sorted(rescan)
+
+
+class CommentMatcher(object):
+
+    """Match the regex selectors of comment rules with one tokenize pass.
+
+    Only the comment tokens of the source are matched, so text within
+    strings is never taken for a comment.  Source which can not be
+    tokenized is matched line by line from the last token read.
+    """
+
+    def __init__(self, rules):
+        """Constructor."""
+        self._selectors = [
+            (index, selector.regex)
+            for index, rule in rules
+            for selector in rule.regex_selectors
+        ]
+        self._search_lines = not any(
+            _COMMENT_ONLY_REGEX.search(regex.pattern)
+            for index, regex in self._selectors)
+
+    def may_match(self, line):
+        """Check if a selector may match a comment of line.
+
+        A selector found within a comment is also found within its line,
+        unless it is anchored or looks around, so lines without a match
+        do not need to be tokenized.
+        """
+        if not self._search_lines:
+            return True
+        for index, regex in self._selectors:
+            if regex.search(line):
+                return True
+        return False
+
+    def _scan_text(self, line_hits, line_number, text):
+        for index, regex in self._selectors:
+            for match in regex.finditer(text):
+                hit = _match_hit(regex, match)
+                if hit:
+                    _add_hit(
+                        line_hits.setdefault(line_number, {}), index, hit)
+
+    def scan_lines(self, lines):
+        """Return a dict of line number to hits of lines with comments."""
+        line_hits = {}
+        last_line = 0
+        readline = functools.partial(next, iter(lines), '')
+        try:
+            for token in tokenize.generate_tokens(readline):
+                last_line = token[2][0]
+                if token[0] == tokenize.COMMENT:
+                    self._scan_text(line_hits, last_line, token[1])
+        except (tokenize.TokenError, SyntaxError):
+            for i in range(max(last_line - 1, 0), len(lines)):
+                self._scan_text(line_hits, i + 1, lines[i])
+        return line_hits
+
+    def scan(self, line):
+        """Return the hits of the comment of a single line."""
+        return self.scan_lines([line]).get(1, {})
+
+
+class FileRules(object):
+
+    """Ordered rules applicable to a file.
+
+    Rules with code selectors are indexed by code, so only the rules
+    selecting codes seen in the file are matched.  The regex selectors
+    of rules matching only comments are matched by a `CommentMatcher`.
+    """
+
+    def __init__(self, rules):
+        """Constructor."""
+        self.indexes = tuple([index for index, rule in rules])
+        self.rules = tuple([rule for index, rule in rules])
+
+        line_rules = [
+            (index, rule) for index, rule in rules
+            if rule.regex_selectors and not rule.comments_only
+        ]
+        comment_rules = [
+            (index, rule) for index, rule in rules
+            if rule.regex_selectors and rule.comments_only
+        ]
+        self.matcher = RegexMatcher(line_rules) if line_rules else None
+        if comment_rules:
+            self.comment_matcher = CommentMatcher(comment_rules)
+        else:
+            self.comment_matcher = None
+        self.comment_positions = frozenset([
+            position for position, rule in enumerate(self.rules)
+            if rule.regex_selectors and rule.comments_only
+        ])
+        self.regex_positions = frozenset([
+            position for position, rule in enumerate(self.rules)
+            if rule.regex_selectors and not rule.comments_only
+        ])
+        # Only regex selectors match the text of lines
+        self.reads_lines = bool(self.matcher or self.comment_matcher)
+
+        self.code_index = {}
+        for position, rule in enumerate(self.rules):
+            for selector in rule.code_selectors:
+                self.code_index.setdefault(selector.code, set()).add(
+                    position)
+        self.uncoded = frozenset([
+            position for position, rule in enumerate(self.rules)
+            if not rule.code_selectors
+        ])
+
+    def scan_lines(self, lines):
+        """Return the regex hits of each line with `RegexMatcher.scan_lines`."""
+        return self.matcher.scan_lines(lines) if self.matcher else {}
+
+    def scan_comments(self, lines):
+        """Return the hits of each line with `CommentMatcher.scan_lines`."""
+        if self.comment_matcher:
+            return self.comment_matcher.scan_lines(lines)
+        return {}
+
+    def unconditional_codes(self, code_sets, codes_id):
+        """Return id of the codes applied to every error in the file, or None.
+
+        Rules with code or regex selectors only apply to some errors, and
+        are skipped when appending codes.  If one replaces the codes of
+        the later unconditional rules, None is returned as the codes
+        differ between errors.
+        """
+        appended = []
+        for rule in reversed(self.rules):
+            conditional = rule.code_selectors or rule.regex_selectors
+            if rule._append_codes:
+                if not conditional:
+                    appended.append(rule.codes)
+            elif conditional:
+                return None
+            else:
+                codes_id = code_sets.intern(rule.codes)
+                break
+
+        for rule_codes in reversed(appended):
+            codes_id = code_sets.append(codes_id, rule_codes)
+        return codes_id
+
+    def possible_codes(self, code_sets, codes_id):
+        """Return id of every code which any rule may apply, or None.
+
+        None is returned if a rule takes its codes from the line.
+        """
+        for rule in self.rules:
+            if rule._vary_codes:
+                return None
+            codes_id = code_sets.append(codes_id, rule.codes)
+        return codes_id
+
+    def _rule_codes(self, position, code, hits):
+        """Return the codes of a candidate rule if it matches, or None."""
+        rule = self.rules[position]
+        if rule.regex_selectors:
+            hit = hits.get(self.indexes[position])
+            if hit is None or (hit is not True and code not in hit):
+                return None
+            if rule._vary_codes:
+                return (code, )
+        return rule.codes
+
+    def apply(self, code_sets, codes_id, line, code, candidates, hits=None,
+              comment_hits=None):
+        """Return id of the codes with the codes of matching rules applied.
+
+        code_sets is the `CodeSets` interning codes_id and the result,
+        and candidates are the rule positions from `ActiveRules.candidates`.
+        hits and comment_hits may be provided from `scan_lines` and
+        `scan_comments`, otherwise the line is scanned for regex selectors.
+
+        The rules are matched from last to first, stopping at the first
+        matching rule which replaces the codes, as it overrides the
+        codes of all earlier rules.
+        """
+        if not self.rules:
+            return codes_id
+
+        appended = None
+        comment_positions = self.comment_positions
+        for position in candidates:
+            rule = self.rules[position]
+            # The line is only scanned when a rule has regex selectors
+            if position in comment_positions:
+                if comment_hits is None:
+                    comment_hits = self.comment_matcher.scan(line)
+                rule_hits = comment_hits
+            else:
+                if rule.regex_selectors and hits is None:
+                    hits = self.matcher.scan(line)
+                rule_hits = hits
+            rule_codes = self._rule_codes(position, code, rule_hits)
+            if rule_codes is None:
+                continue
+            if not rule._append_codes:
+                codes_id = code_sets.intern(rule_codes)
+                break
+            if appended is None:
+                appended = []
+            appended.append(rule_codes)
+
+        if appended:
+            for rule_codes in reversed(appended):
+                codes_id = code_sets.append(codes_id, rule_codes)
+        return codes_id
+
+
+class ActiveRules(object):
+
+    """Candidate rules of a file, activated by the codes seen in the file.
+
+    Rules with code selectors are added as their codes are seen, so
+    the candidates of each error are found without revisiting codes.
+    """
+
+    def __init__(self, file_rules):
+        """Constructor."""
+        self.file_rules = file_rules
+        self._positions = file_rules.uncoded
+        self._candidates = tuple(sorted(self._positions, reverse=True))
+
+    def add_code(self, code):
+        """Activate the rules selecting a code seen in the file."""
+        selected = self.file_rules.code_index.get(code)
+        if selected and not selected <= self._positions:
+            self._positions = self._positions | selected
+            self._candidates = tuple(sorted(self._positions, reverse=True))
+
+    def candidates(self, code):
+        """Return positions of rules selected by seen codes or code."""
+        selected = self.file_rules.code_index.get(code)
+        if selected and not selected <= self._positions:
+            return sorted(self._positions | selected, reverse=True)
+        return self._candidates
+
+
+class RuleSet(object):
+
+    """Ordered rules with a cache of the rules applicable to each file.
+
+    Environment markers are evaluated once, when the rule set is created,
+    so only the file selectors decide which rules apply to a file.
+    The rules as parsed are kept as `parsed_rules`.  The rules with
+    markers evaluated may be given as `folded_rules`, as when cached.
+    """
+
+    def __init__(self, rules, cache_size=DEFAULT_CACHE_SIZE,
+                 folded_rules=None):
+        """Constructor."""
+        self.parsed_rules = tuple(rules)
+        if folded_rules is None:
+            folded_rules = fold_environment_markers(self.parsed_rules)
+        self.rules = tuple(folded_rules)
+        self._file_rules = LRUCache(cache_size)
+        self._subsets = LRUCache(cache_size)
+        self._file_matcher = FileMatcher(enumerate(self.rules))
+        self._unscoped = self._unscoped_indexes()
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __getstate__(self):
+        # The file matcher is built again, as unpickling compiles its regexes
+        return {
+            'parsed_rules': self.parsed_rules,
+            'rules': self.rules,
+            'cache_size': self._file_rules.maxsize,
+        }
+
+    def __setstate__(self, state):
+        self.parsed_rules = state['parsed_rules']
+        self.rules = state['rules']
+        self._file_rules = LRUCache(state['cache_size'])
+        self._subsets = LRUCache(state['cache_size'])
+        self._file_matcher = FileMatcher(enumerate(self.rules))
+        self._unscoped = self._unscoped_indexes()
+
+    def _unscoped_indexes(self):
+        """Return the indexes of rules without file selectors."""
+        return tuple([
+            index for index, rule in enumerate(self.rules)
+            if not rule.file_selectors
+        ])
+
+    def _subset(self, indexes):
+        """Return the `FileRules` of the rules at indexes."""
+        # Files sharing the same rules share the compiled regexes
+        file_rules = self._subsets.get(indexes)
+        if file_rules is None:
+            file_rules = FileRules(
+                [(index, self.rules[index]) for index in indexes])
+            self._subsets[indexes] = file_rules
+        return file_rules
+
+    def for_file(self, filename):
+        """Return the `FileRules` whose file and marker selectors match."""
+        file_rules = self._file_rules.get(filename)
+        if file_rules is None:
+            matched = self._file_matcher.match(filename)
+            if matched:
+                indexes = tuple(sorted(matched.union(self._unscoped)))
+            else:
+                indexes = self._unscoped
+            file_rules = self._subset(indexes)
+            self._file_rules[filename] = file_rules
+        return file_rules
+
+    def compile(self):
+        """Compile the regex selectors of all rules."""
+        for rule in self.rules:
+            for selector in rule.regex_selectors:
+                selector.regex  # compiled when first used
+
+    def warm(self):
+        """Compile the rules before they are used.
+
+        The regex selectors are compiled, with the `FileRules` of files
+        not matching any file selector.  The `FileRules` of other files
+        depend on the files checked, so are built when first used.
+        """
+        self.compile()
+        self._subset(self._unscoped)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Flake8 putty profiling of rules."""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import sys
+from timeit import default_timer
+
+from flake8_putty.config import RegexSelector
+from flake8_putty.extension import PuttyIgnoreCode
+
+COUNTER_PREFIX = 'putty-stats:'
+
+FIELDS = (
+    'evaluations',
+    'matches',
+    'seconds',
+    'file_seconds',
+    'code_seconds',
+    'regex_seconds',
+)
+
+
+def _add(counters, key, value):
+    # pep8 StandardReport counters are a dict, flake8 QueueReport uses a
+    # defaultdict, whose values are summed from all processes
+    counters[key] = counters.get(key, 0) + value
+
+
+def rule_text(rule):
+    """Return the rule in the syntax of putty-ignore and putty-select."""
+    selectors = ', '.join(
+        '/%s/' % selector.raw if isinstance(selector, RegexSelector)
+        else selector.raw
+        for selector in rule._selectors)
+    return '%s : %s%s' % (
+        selectors, '+' if rule._append_codes else '', ', '.join(rule.codes))
+
+
+def timed_match(rule, filename, line, codes):
+    """Return codes of rule if it matches, and the seconds of each selector.
+
+    The file, code and regex selectors are matched in the order of
+    `Rule.match`, timing `file_match_any`, `codes_match_any` and
+    `regex_match_any`.  Environment markers are already evaluated by
+    the rule sets.
+    """
+    seconds = [0, 0, 0]
+    matched = True
+
+    if rule.file_selectors:
+        start = default_timer()
+        matched = rule.file_match_any(filename)
+        seconds[0] = default_timer() - start
+
+    if matched and rule.code_selectors:
+        start = default_timer()
+        matched = rule.codes_match_any(codes)
+        seconds[1] = default_timer() - start
+
+    if matched and rule.regex_selectors:
+        start = default_timer()
+        matched = rule.regex_match_any(line, codes)
+        seconds[2] = default_timer() - start
+
+    if not matched:
+        return None, seconds
+    if rule._vary_codes:
+        return (codes[-1], ), seconds
+    return rule.codes, seconds
+
+
+class StatsIgnoreCode(PuttyIgnoreCode):
+
+    """`PuttyIgnoreCode` recording evaluations, matches and time of each rule.
+
+    Each error is decided as by `PuttyIgnoreCode`, and every rule is also
+    matched as by `Rule.match`, recording the result in the counters of
+    the reporter, which flake8 sums from all --jobs processes.
+    """
+
+    def _record_rules(self, counters, kind, rule_set, filename, line, codes):
+        for index, rule in enumerate(rule_set.rules):
+            rule_codes, seconds = timed_match(rule, filename, line, codes)
+            prefix = '%s%s:%d:' % (COUNTER_PREFIX, kind, index)
+            _add(counters, prefix + 'evaluations', 1)
+            if rule_codes is not None:
+                _add(counters, prefix + 'matches', 1)
+            _add(counters, prefix + 'seconds', sum(seconds))
+            _add(counters, prefix + 'file_seconds', seconds[0])
+            _add(counters, prefix + 'code_seconds', seconds[1])
+            _add(counters, prefix + 'regex_seconds', seconds[2])
+
+    def ignore_error(self, reporter, line_number, code):
+        """Check if the error should be ignored, recording rule stats."""
+        state = self.file_state(reporter)
+        try:
+            line = state.lines[line_number - 1]
+        except IndexError:
+            line = ''
+        codes = sorted(state.seen_codes - set([code])) + [code]
+
+        counters = reporter.counters
+        self._record_rules(
+            counters, 'ignore', self.ignore_rules, reporter.filename, line,
+            codes)
+        self._record_rules(
+            counters, 'select', self.select_rules, reporter.filename, line,
+            codes)
+
+        start = default_timer()
+        ignored = super(StatsIgnoreCode, self).ignore_error(
+            reporter, line_number, code)
+        _add(counters, COUNTER_PREFIX + 'errors', 1)
+        _add(counters, COUNTER_PREFIX + 'seconds', default_timer() - start)
+        return ignored
+
+
+def collect_stats(ignore_code, counters):
+    """Return the stats of each rule and the totals from the counters."""
+    rules = []
+    for kind, rule_set in (('ignore', ignore_code.ignore_rules),
+                           ('select', ignore_code.select_rules)):
+        for index, rule in enumerate(rule_set.rules):
+            prefix = '%s%s:%d:' % (COUNTER_PREFIX, kind, index)
+            stats = dict(
+                (field, counters.get(prefix + field, 0)) for field in FIELDS)
+            stats['kind'] = kind
+            stats['rule'] = rule_text(rule)
+            rules.append(stats)
+    rules.sort(key=lambda stats: stats['seconds'], reverse=True)
+
+    return {
+        'errors': counters.get(COUNTER_PREFIX + 'errors', 0),
+        'seconds': counters.get(COUNTER_PREFIX + 'seconds', 0),
+        'warm_seconds': ignore_code.warm_time,
+        'rules': rules,
+    }
+
+
+def format_table(stats):
+    """Return lines of a table of rule stats."""
+    lines = [
+        'putty: %d errors decided in %.6f seconds' % (
+            stats['errors'], stats['seconds']),
+    ]
+    if stats['warm_seconds'] is not None:
+        lines.append(
+            'putty: rules compiled in %.6f seconds' % stats['warm_seconds'])
+
+    lines.append('%6s %11s %8s %10s %10s %10s %10s  %s' % (
+        'kind', 'evaluations', 'matches', 'seconds', 'file', 'code',
+        'regex', 'rule'))
+    for rule in stats['rules']:
+        lines.append('%6s %11d %8d %10.6f %10.6f %10.6f %10.6f  %s' % (
+            rule['kind'], rule['evaluations'], rule['matches'],
+            rule['seconds'], rule['file_seconds'], rule['code_seconds'],
+            rule['regex_seconds'], rule['rule']))
+    return lines
+
+
+def print_stats(options, output_format, stream=None):
+    """Print the rule stats of the flake8 run in table or json format."""
+    stream = stream or sys.stdout
+    stats = collect_stats(options.ignore_code, options.report.counters)
+    if output_format == 'json':
+        stream.write(json.dumps(stats, indent=2, sort_keys=True) + '\n')
+    else:
+        stream.write('\n'.join(format_table(stats)) + '\n')
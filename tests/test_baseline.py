@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Test baseline of existing errors."""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from flake8_putty import baseline
+from flake8_putty.__main__ import main
+
+from tests.test_extension import FakeReporter, parse_options
+
+
+class TestBaseline(TestCase):
+
+    """Test keys and files of baselines."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'baseline')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_normalise_line(self):
+        assert baseline.normalise_line('  x  =  1 \n') == 'x = 1'
+        assert baseline.normalise_line(b'\tx = 1\r\n') == 'x = 1'
+
+    def test_file_key(self):
+        assert baseline.file_key('foo.py') == 'foo.py'
+        assert baseline.file_key('./foo/bar.py') == 'foo/bar.py'
+        assert baseline.file_key(os.path.abspath('foo.py')) == 'foo.py'
+
+    def test_error_key(self):
+        key = baseline.error_key('foo.py', 'E101', '    x = 1\n')
+        assert key == baseline.error_key('foo.py', 'E101', 'x  =  1')
+        assert key != baseline.error_key('bar.py', 'E101', 'x = 1')
+        assert key != baseline.error_key('foo.py', 'E102', 'x = 1')
+        assert key != baseline.error_key('foo.py', 'E101', 'x = 2')
+        assert 0 <= key < 2 ** 64
+
+    def test_dump_load(self):
+        keys = [baseline.error_key('foo.py', 'E101', str(i)) for i in range(3)]
+        baseline.dump(self.path, keys)
+        assert os.path.getsize(self.path) == (
+            len(baseline.BASELINE_MAGIC) + 3 * baseline.KEY_SIZE)
+
+        loaded = baseline.load(self.path)
+        assert loaded.keys == frozenset(keys)
+        assert len(loaded) == 3
+        assert loaded.digest
+        assert loaded.ignores('foo.py', 'E101', '1')
+        assert not loaded.ignores('foo.py', 'E101', '3')
+
+    def test_load_missing(self):
+        loaded = baseline.load(self.path)
+        assert len(loaded) == 0
+        assert not loaded.digest
+
+    def test_load_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'foo')
+        self.assertRaises(ValueError, baseline.load, self.path)
+
+    def test_ignore_error(self):
+        baseline.dump(self.path, [
+            baseline.error_key('foo.py', 'E101', 'foo'),
+            baseline.error_key('foo.py', 'E102', 'bar'),
+        ])
+        options = parse_options('E102 : +E103', putty_baseline=self.path)
+        reporter = FakeReporter(lines=['bar\n', '  foo\n', 'bar\n'])
+        ignore_error = options.ignore_code.ignore_error
+        assert ignore_error(reporter, 2, 'E101')
+        assert not ignore_error(reporter, 1, 'E101')
+        assert ignore_error(reporter, 3, 'E102')
+        assert not ignore_error(reporter, 1, 'E103')
+        assert options.ignore_code.needs_lines('bar.py')
+
+    def test_baseline_only(self):
+        options = parse_options(putty_baseline=self.path)
+        reporter = FakeReporter(lines=['foo\n'])
+        assert not options.ignore_code.ignore_error(reporter, 1, 'E101')
+
+
+class TestBaselineMain(TestCase):
+
+    """Test the baseline command."""
+
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.tempdir = tempfile.mkdtemp()
+        os.chdir(self.tempdir)
+        with open('foo.py', 'w') as f:
+            f.write('import os\nimport sys\nx=os\n')
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.tempdir)
+
+    def test_baseline_main(self):
+        assert main([
+            'baseline', '--putty-baseline=b', '--putty-ignore=/x/ : E225',
+        ]) == 0
+        assert baseline.load('b').keys == frozenset([
+            baseline.error_key('foo.py', 'F401', 'import sys'),
+        ])
+
+        # The existing baseline is not used
+        assert main(['baseline', '--putty-baseline=b', 'foo.py']) == 0
+        loaded = baseline.load('b')
+        assert loaded.keys == frozenset([
+            baseline.error_key('foo.py', 'F401', 'import sys'),
+            baseline.error_key('foo.py', 'E225', 'x=os'),
+        ])
+
+    def test_baseline_option_value(self):
+        assert main(['baseline', '--putty-baseline', 'b']) == 0
+        assert len(baseline.load('b')) == 2
+
+    def test_baseline_required(self):
+        assert main(['baseline']) == 2
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Test the benchmark suite runs."""
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+BENCHMARK = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'benchmarks', 'benchmark.py')
+
+
+class TestBenchmark(TestCase):
+
+    """Test running a small benchmark."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def run_benchmark(self, *args):
+        process = subprocess.Popen(
+            [sys.executable, BENCHMARK, '--scenario', 'small',
+             '--files', '2', '--lines', '5', '--errors-per-line', '1',
+             '--rules', '5', '--repeat', '1',
+             ] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output = process.communicate()[0].decode('utf-8')
+        return process.returncode, output
+
+    def test_baseline(self):
+        baseline = os.path.join(self.tempdir, 'baseline.json')
+        returncode, output = self.run_benchmark('--save-baseline', baseline)
+        assert returncode == 0
+        assert 'ignore_code' in output
+
+        with open(baseline) as f:
+            results = json.load(f)['results']
+        assert results['small']['ignore_code']['errors'] == 10
+        assert results['small']['rule_match']['errors'] == 10
+
+        results['small']['ignore_code']['errors_per_second'] = 1e12
+        with open(baseline, 'w') as f:
+            json.dump({'results': results}, f)
+        returncode, output = self.run_benchmark('--baseline', baseline)
+        assert returncode == 1
+        assert 'Slower than baseline: small: speedup' in output
+
+        results['small']['ignore_code']['errors_per_second'] = 1.0
+        results['small']['rule_match']['errors_per_second'] = 1e12
+        with open(baseline, 'w') as f:
+            json.dump({'results': results}, f)
+        returncode, output = self.run_benchmark('--baseline', baseline)
+        assert returncode == 0, output
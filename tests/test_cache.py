@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Test on-disk cache of compiled rule sets and verdicts."""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from flake8_putty import cache
+from flake8_putty.config import Parser
+from flake8_putty.extension import AutoLineDisableRule
+from flake8_putty.ruleset import RuleSet
+
+
+class TestCache(TestCase):
+
+    """Test loading and dumping cached values."""
+
+    def setUp(self):
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.cache_dir))
+
+    def test_cache_key(self):
+        key = cache.cache_key('0.4.0', 'foo.py : E101', '')
+        assert key == cache.cache_key('0.4.0', 'foo.py : E101', '')
+        assert key != cache.cache_key('0.4.0', 'foo.py : E102', '')
+        assert key != cache.cache_key('0.4.1', 'foo.py : E101', '')
+
+    def test_load_missing(self):
+        assert cache.load(self.cache_dir, 'foo') is None
+
+    def test_load_invalid(self):
+        os.makedirs(self.cache_dir)
+        with open(cache.cache_filename(self.cache_dir, 'foo'), 'wb') as f:
+            f.write(b'foo')
+        assert cache.load(self.cache_dir, 'foo') is None
+
+    def test_dump_rule_set(self):
+        rules = Parser("""
+        foo.py : E101
+        /foo/ : E102
+        tests/ : +E103
+        python_version < '2', E104 : E105
+        python_version > '2', E106 : E107
+        """)._rules
+        ignore = RuleSet(rules + [AutoLineDisableRule()])
+        ignore.for_file('foo.py')
+        cache.dump_rule_sets(self.cache_dir, 'foo', (RuleSet([]), ignore))
+        assert os.listdir(self.cache_dir) == [
+            os.path.basename(cache.cache_filename(self.cache_dir, 'foo'))]
+        assert cache.cache_filename(self.cache_dir, 'foo').endswith('.json')
+
+        select, loaded = cache.load_rule_sets(self.cache_dir, 'foo')
+        assert select.parsed_rules == ()
+        assert loaded.parsed_rules[:5] == ignore.parsed_rules[:5]
+        assert loaded.rules[:4] == ignore.rules[:4]
+        assert not loaded.rules[3].environment_marker_selector
+        assert loaded.rules[0] is loaded.parsed_rules[0]
+        assert len(loaded.rules) == 5
+        assert isinstance(loaded.rules[4], AutoLineDisableRule)
+        assert len(loaded._file_rules) == 0
+        assert loaded.for_file('tests/foo.py').rules[:2] == (
+            rules[1], rules[2])
+
+    def test_load_rule_sets_invalid(self):
+        for value in (
+            {},
+            [{'parsed_rules': [[[['pickle', 'foo']], ['E101'], False]],
+              'rules': []}],
+            [{'parsed_rules': [[[['code', 1]], ['E101'], False]],
+              'rules': []}],
+            [{'parsed_rules': [[[], ['E101']]], 'rules': []}],
+        ):
+            cache.dump(self.cache_dir, 'foo', value)
+            assert cache.load_rule_sets(self.cache_dir, 'foo') is None
+
+    def test_rule_json(self):
+        rule = Parser("tests/, /foo/, E101, python_version > '2' : +E102")._rules[0]
+        value = cache.rule_to_json(rule)
+        assert value == [
+            [['file', 'tests/'], ['regex', 'foo'], ['code', 'E101'],
+             ['marker', "python_version > '2'"]],
+            ['E102'], True]
+        assert cache.rule_from_json(value) == rule
+        assert cache.rule_from_json(
+            cache.rule_to_json(AutoLineDisableRule())).codes == ['(?P<codes>)']
+
+    def test_prune(self):
+        os.makedirs(self.cache_dir)
+        for i, key in enumerate(['foo', 'bar', 'baz']):
+            cache.dump(self.cache_dir, key, 'x' * 100, cache.VERDICT_PREFIX)
+            filename = cache.cache_filename(
+                self.cache_dir, key, cache.VERDICT_PREFIX)
+            os.utime(filename, (time.time() - 100 + i, time.time() - 100 + i))
+        other = os.path.join(self.cache_dir, 'other')
+        open(other, 'w').close()
+
+        assert cache.load(self.cache_dir, 'foo', cache.VERDICT_PREFIX)
+        size = os.path.getsize(other) + sum(
+            os.path.getsize(os.path.join(self.cache_dir, filename))
+            for filename in os.listdir(self.cache_dir))
+        cache.prune(self.cache_dir, size - 1)
+        assert sorted(os.listdir(self.cache_dir)) == sorted([
+            'other',
+            os.path.basename(cache.cache_filename(
+                self.cache_dir, 'baz', cache.VERDICT_PREFIX)),
+            os.path.basename(cache.cache_filename(
+                self.cache_dir, 'foo', cache.VERDICT_PREFIX)),
+        ])
+
+        cache.prune(self.cache_dir, 0)
+        assert os.listdir(self.cache_dir) == ['other']
+        cache.prune(os.path.join(self.cache_dir, 'missing'), 0)
+
+
+class TestVerdictCache(TestCase):
+
+    """Test caching verdicts of files."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_key(self):
+        verdicts = cache.VerdictCache(self.cache_dir, 'foo')
+        key = verdicts.key('foo.py', ['foo\n', 'bar\n'])
+        assert key == verdicts.key('foo.py', ['foo\nbar\n'])
+        assert key == verdicts.key('./foo.py', ['foo\nbar\n'])
+        assert key == verdicts.key(os.path.abspath('foo.py'), ['foo\nbar\n'])
+        assert key != verdicts.key('bar.py', ['foo\n', 'bar\n'])
+        assert key != verdicts.key('foo.py', ['foo\n', 'baz\n'])
+        assert key != cache.VerdictCache(self.cache_dir, 'bar').key(
+            'foo.py', ['foo\n', 'bar\n'])
+        assert verdicts.key('foo.py', [b'foo\n']) == verdicts.key(
+            'foo.py', ['foo\n'])
+
+    def test_load(self):
+        verdicts = cache.VerdictCache(self.cache_dir, 'foo')
+        assert verdicts.load('bar') is None
+        verdicts.dump('bar', [(1, 'E101', True)])
+        assert verdicts.load('bar') == ((1, 'E101', True), )
+
+    def test_load_invalid(self):
+        verdicts = cache.VerdictCache(self.cache_dir, 'foo')
+        for value in (
+            {'foo': 'bar'},
+            [[1, 'E101']],
+            [['1', 'E101', True]],
+            [[1, 'E101', 'yes']],
+        ):
+            cache.dump(self.cache_dir, 'bar', value, cache.VERDICT_PREFIX)
+            assert verdicts.load('bar') is None
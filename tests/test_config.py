@@ -10,13 +10,14 @@ except ImportError:
     from unittest import TestCase, SkipTest
 
 from flake8_putty.config import (
+    SELECTOR_SPLITTER,
     CodeSelector,
     EnvironmentMarkerSelector,
     FileSelector,
     Parser,
     RegexSelector,
     Rule,
-    markers,
+    import_markers,
 )
 from flake8_putty.extension import AutoLineDisableRule
 
@@ -330,6 +331,11 @@ class TestParser(TestCase):
             (2, ['file.py'], 'E101'),
         ]
 
+    def test_selector_splitter(self):
+        assert SELECTOR_SPLITTER.findall('foo.py, /a,b/, E101') == [
+            'foo.py', '/a,b/', 'E101',
+        ]
+
     def test_multiline(self):
         p = Parser("""
         E100 : E101
@@ -458,6 +464,21 @@ class TestMatchRegex(TestCase):
             ['E102'],
         )
 
+    def test_selector_regex_codes_match(self):
+        p = Parser('/disable=(?P<codes>[A-Z0-9]*)/ : +(?P<codes>)')
+        rule = p._rules[0]
+        line = ' foo bar # disable=E101 disable=E102'
+        assert rule.match('foo.py', line, ['E101']) == (rule, ('E101', ))
+        assert rule.match('foo.py', line, ['E102']) == (rule, ('E102', ))
+        assert not rule.match('foo.py', line, ['E103'])
+        assert rule.codes == ('(?P<codes>)', )
+
+    def test_selector_regex_match(self):
+        p = Parser('/foo/ : E101')
+        rule = p._rules[0]
+        assert rule.match('foo.py', 'foo', ['E102']).codes == ('E101', )
+        assert not rule.match('foo.py', 'bar', ['E102'])
+
     def test_selector_auto(self):
         rule = AutoLineDisableRule()
         assert rule.regex_match_any('foo # flake8: disable=E101', ['E101'])
@@ -500,7 +521,7 @@ class TestMatchEnvironmentMarker(TestCase):
 
     @classmethod
     def setUpClass(cls):
-        if not markers:
+        if not import_markers():
             raise SkipTest('Package packaging not found')
 
     def test_selector_environment_marker(self):
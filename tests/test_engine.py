@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Test the compiled engine against the reference engine."""
+from __future__ import unicode_literals
+
+import random
+from unittest import TestCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock  # Python 3.2 and lower
+
+from flake8_putty.config import import_markers
+from flake8_putty.engine import ReferenceIgnoreCode, VerifyIgnoreCode
+
+from tests.test_extension import FakeReporter, parse_options
+
+FILENAMES = [
+    'foo.py',
+    'bar.py',
+    'pkg/foo.py',
+    'pkg/sub/baz.py',
+    'tests/test_foo.py',
+]
+
+FILE_SELECTORS = [
+    'foo.py',
+    './foo.py',
+    'pkg/',
+    'pkg/sub/',
+    'pkg/*.py',
+    'pkg/*/baz.py',
+    'tests/*.py',
+]
+
+REGEX_SELECTORS = [
+    '/foo/',
+    '/^bar/',
+    '/baz$/',
+    '/(?i)QUX/',
+    '/a\\s+b/',
+    '/# !qa/',
+    '/foo(?=\\s*bar)/',
+    '/foo(?!\\s*bar)/',
+    '/(?<=foo )bar/',
+]
+
+CODES_REGEX_SELECTOR = '/# !qa: *(?P<codes>[A-Z0-9, ]*)/'
+
+CODES = ['E101', 'E102', 'E201', 'W291', 'F401']
+
+RULE_CODES = CODES + ['E1', 'W']
+
+MARKERS = ["python_version > '2.4'", "python_version < '2.4'"]
+
+WORDS = [
+    'foo', 'bar', 'baz', 'qux', 'QUX', 'a  b',
+    '# !qa: E101, E102', '# flake8: disable=E201, F401',
+]
+
+
+def random_rule(rng):
+    """Return the text of a random rule."""
+    selectors = []
+    if rng.random() < 0.5:
+        selectors.append(rng.choice(FILE_SELECTORS))
+    if rng.random() < 0.4:
+        selectors.append(rng.choice(REGEX_SELECTORS))
+    if rng.random() < 0.3:
+        selectors.append(rng.choice(CODES))
+    if rng.random() < 0.2 and import_markers():
+        selectors.append(rng.choice(MARKERS))
+
+    if rng.random() < 0.1:
+        selectors.append(CODES_REGEX_SELECTOR)
+        codes = '(?P<codes>)'
+    else:
+        codes = ','.join(rng.sample(RULE_CODES, rng.randint(1, 3)))
+
+    if not selectors:
+        selectors.append(rng.choice(FILE_SELECTORS))
+    if rng.random() < 0.7:
+        codes = '+' + codes
+    return '%s : %s' % (', '.join(selectors), codes)
+
+
+def random_lines(rng):
+    """Return random source lines."""
+    return [
+        ' '.join(rng.sample(WORDS, rng.randint(0, 3))) + '\n'
+        for i in range(rng.randint(1, 6))
+    ]
+
+
+def random_errors(rng, lines):
+    """Return random errors, including some after the last line."""
+    return [
+        (rng.randint(1, len(lines) + 1), rng.choice(CODES))
+        for i in range(rng.randint(1, 12))
+    ]
+
+
+class TestDifferential(TestCase):
+
+    """Test both engines decide random errors of random rules the same."""
+
+    def check_case(self, rng):
+        kwargs = dict(
+            putty_ignore='\n'.join(
+                random_rule(rng) for i in range(rng.randint(1, 8))),
+            putty_select='\n'.join(
+                random_rule(rng) for i in range(rng.randint(0, 3))),
+            putty_auto_ignore=rng.random() < 0.3,
+            putty_eager_scan=rng.random() < 0.5,
+            ignore=rng.choice([(), ('E123', 'E226'), ('E', )]),
+            select=rng.choice([(), ('E1', ), ('W', )]),
+        )
+        compiled = parse_options(**kwargs).ignore_code
+        reference = parse_options(putty_engine='reference', **kwargs)
+        reference = reference.ignore_code
+        assert isinstance(reference, ReferenceIgnoreCode)
+
+        for filename in rng.sample(FILENAMES, rng.randint(1, 3)):
+            lines = random_lines(rng)
+            compiled_reporter = FakeReporter(filename, lines)
+            reference_reporter = FakeReporter(filename, lines)
+            for line_number, code in random_errors(rng, lines):
+                assert (
+                    compiled.ignore_error(
+                        compiled_reporter, line_number, code) ==
+                    reference.ignore_error(
+                        reference_reporter, line_number, code)
+                ), (kwargs, filename, lines, line_number, code)
+
+    def test_random(self):
+        rng = random.Random(0)
+        for i in range(300):
+            self.check_case(rng)
+
+
+class TestVerifyIgnoreCode(TestCase):
+
+    """Test reporting errors where the engines differ."""
+
+    def test_verify(self):
+        options = parse_options(
+            '/foo/ : +E101', putty_auto_ignore=True, putty_engine='verify')
+        assert isinstance(options.ignore_code, VerifyIgnoreCode)
+        reporter = FakeReporter(lines=[
+            'foo  # flake8: disable=E102\n',
+            'bar = "# flake8: disable=E102"\n',
+        ])
+        with mock.patch('sys.stderr') as stderr:
+            assert options.ignore_code.ignore_error(reporter, 1, 'E101')
+            assert options.ignore_code.ignore_error(reporter, 1, 'E102')
+            assert not stderr.write.called
+
+            assert not options.ignore_code.ignore_error(reporter, 2, 'E102')
+            output = ''.join(
+                call[0][0] for call in stderr.write.call_args_list)
+        assert output == (
+            'putty: engines differ for foo.py:2 E102: '
+            'reference ignored=True, compiled ignored=False\n')
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Test extension without flake8."""
+from __future__ import unicode_literals
+
+import gc
+import os
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock  # Python 3.2 and lower
+
+from flake8_putty.extension import PuttyExtension
+
+
+class FakeOptions(object):
+
+    """Options as parsed by flake8."""
+
+    def __init__(self, putty_ignore='', putty_select='', **kwargs):
+        self.putty_ignore = putty_ignore
+        self.putty_select = putty_select
+        self.putty_auto_ignore = False
+        self.putty_eager_scan = False
+        self.putty_cache_dir = ''
+        self.putty_cache_size = 64
+        self.putty_baseline = ''
+        self.putty_warm = False
+        self.putty_stats = None
+        self.putty_engine = 'compiled'
+        self.verbose = 0
+        self.select = ()
+        self.ignore = ('E123', 'E226')
+        self.report = FakeReporter()
+        self.__dict__.update(kwargs)
+
+
+class FakeReporter(object):
+
+    """Reporter with the state used by putty."""
+
+    def __init__(self, filename='foo.py', lines=None, counters=None):
+        self.filename = filename
+        self.lines = lines or []
+        self.counters = counters or {}
+
+
+def parse_options(*args, **kwargs):
+    options = FakeOptions(*args, **kwargs)
+    PuttyExtension.parse_options(options)
+    return options
+
+
+class TestPuttyIgnoreCode(TestCase):
+
+    """Test the decision whether to ignore an error."""
+
+    def test_ignore(self):
+        options = parse_options("""
+            foo.py : +E101
+            /bar/ : E102
+            """)
+        reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+        assert options.ignore_code.ignore_error(reporter, 1, 'E101')
+        assert options.ignore_code.ignore_error(reporter, 1, 'E123')
+        assert not options.ignore_code.ignore_error(reporter, 1, 'E102')
+        assert options.ignore_code.ignore_error(reporter, 2, 'E102')
+        assert not options.ignore_code.ignore_error(reporter, 2, 'E101')
+        assert not options.ignore_code.ignore_error(reporter, 2, 'E123')
+        assert options.ignore_code.ignore_error(reporter, 3, 'E101')
+
+    def test_select(self):
+        options = parse_options(
+            putty_ignore='foo.py : E',
+            putty_select='/bar/ : E101',
+        )
+        reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+        assert options.ignore_code.ignore_error(reporter, 1, 'E101')
+        assert not options.ignore_code.ignore_error(reporter, 2, 'E101')
+        assert options.ignore_code.ignore_error(reporter, 2, 'E102')
+
+    def test_codes_seen(self):
+        options = parse_options('E101 : +E102')
+        reporter = FakeReporter(lines=['foo\n'])
+        ignore_error = options.ignore_code.ignore_error
+        assert not ignore_error(reporter, 1, 'E102')
+        assert not ignore_error(reporter, 1, 'E101')
+        assert ignore_error(reporter, 1, 'E102')
+        assert reporter._putty_file.seen_codes == set(['E101', 'E102'])
+
+        reporter.filename = 'bar.py'
+        reporter.lines = ['bar\n']
+        assert not ignore_error(reporter, 1, 'E102')
+
+    def test_codes_seen_ignored(self):
+        options = parse_options("""
+            E101 : +E102
+            E101 : +E101
+            """)
+        reporter = FakeReporter(lines=['foo\n'])
+        ignore_error = options.ignore_code.ignore_error
+        assert ignore_error(reporter, 1, 'E101')
+        assert not ignore_error(reporter, 1, 'E102')
+
+    def test_scan_once(self):
+        options = parse_options("""
+            /bar/ : +E101
+            E102 : +E103
+            """)
+        reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+        ignore_error = options.ignore_code.ignore_error
+        matcher = options.ignore_code.ignore_rules.for_file('foo.py').matcher
+        with mock.patch.object(matcher, 'scan', wraps=matcher.scan) as scan:
+            assert not ignore_error(reporter, 2, 'E102')
+            assert ignore_error(reporter, 2, 'E101')
+            assert ignore_error(reporter, 2, 'E103')
+            assert not ignore_error(reporter, 1, 'E101')
+        assert scan.call_count == 2
+
+    def test_options_unchanged(self):
+        options = parse_options('foo.py : E101', 'foo.py : E102')
+        reporter = FakeReporter(lines=['foo\n'])
+        assert options.ignore_code.ignore_error(reporter, 1, 'E101')
+        assert options.ignore == ('E123', 'E226')
+        assert options.select == ()
+
+    def test_threads(self):
+        options = parse_options("""
+            foo.py : +E101
+            /bar/ : E102
+            /# !qa: *(?P<codes>[A-Z0-9, ]*)/ : +(?P<codes>)
+            """)
+        reporter = FakeReporter(
+            lines=['foo\n', 'bar\n', 'baz  # !qa: E103\n'])
+        errors = [
+            (line_number, code)
+            for line_number in (1, 2, 3)
+            for code in ('E101', 'E102', 'E103', 'E123')
+        ] * 50
+
+        def ignore(error):
+            return options.ignore_code.ignore_error(reporter, *error)
+
+        expected = [ignore(error) for error in errors]
+        pool = ThreadPool(4)
+        try:
+            assert pool.map(ignore, errors) == expected
+        finally:
+            pool.close()
+
+    def test_skip_file(self):
+        options = parse_options("""
+            vendor/ : E,W,F,C
+            vendor/foo.py : +E101
+            vendor/bar.py : E
+            vendor/baz.py, /foo/ : E
+            """)
+        assert options.ignore_code.skip_file('vendor/foo.py')
+        assert not options.ignore_code.skip_file('vendor/bar.py')
+        assert not options.ignore_code.skip_file('vendor/baz.py')
+        assert not options.ignore_code.skip_file('foo.py')
+
+    def test_skip_file_selected(self):
+        options = parse_options(
+            putty_ignore='vendor/ : E,W,F,C',
+            putty_select='vendor/foo.py, /foo/ : E101',
+        )
+        assert options.ignore_code.skip_file('vendor/bar.py')
+        assert not options.ignore_code.skip_file('vendor/foo.py')
+
+    def test_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            options = parse_options('/foo/ : E101', putty_cache_dir=cache_dir)
+            assert len(os.listdir(cache_dir)) == 1
+            cached = parse_options('/foo/ : E101', putty_cache_dir=cache_dir)
+            assert len(os.listdir(cache_dir)) == 1
+            assert cached.putty_ignore is not options.putty_ignore
+            assert cached.putty_ignore.rules == options.putty_ignore.rules
+
+            reporter = FakeReporter(lines=['foo\n'])
+            assert cached.ignore_code.ignore_error(reporter, 1, 'E101')
+
+            parse_options('/bar/ : E101', putty_cache_dir=cache_dir)
+            assert len(os.listdir(cache_dir)) == 2
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_verdict_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        rules = """
+            /foo/ : E101
+            E102 : +E103
+            """
+        errors = [(1, 'E101'), (2, 'E102'), (2, 'E103'), (2, 'E101')]
+        try:
+            options = parse_options(rules, putty_cache_dir=cache_dir)
+            ignore_code = options.ignore_code
+            reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+            verdicts = [
+                ignore_code.ignore_error(reporter, line_number, code)
+                for line_number, code in errors]
+            assert verdicts == [True, False, True, False]
+            ignore_code.end_file(reporter)
+            assert len(os.listdir(cache_dir)) == 2
+
+            options = parse_options(rules, putty_cache_dir=cache_dir)
+            ignore_code = options.ignore_code
+            ignore_code._ignore_error = None
+            reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+            assert [
+                ignore_code.ignore_error(reporter, line_number, code)
+                for line_number, code in errors] == verdicts
+            assert reporter._putty_file.seen_codes == set(['E101', 'E102'])
+
+            # Errors differing from the cache are decided by the rules
+            options = parse_options(rules, putty_cache_dir=cache_dir)
+            ignore_code = options.ignore_code
+            reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+            assert ignore_code.ignore_error(reporter, 1, 'E101')
+            assert not ignore_code.ignore_error(reporter, 1, 'E102')
+            assert ignore_code.ignore_error(reporter, 2, 'E103')
+            ignore_code.end_file(reporter)
+            assert len(os.listdir(cache_dir)) == 2
+
+            options = parse_options(
+                rules, putty_cache_dir=cache_dir, ignore=('E102', ))
+            reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+            assert options.ignore_code.ignore_error(reporter, 2, 'E102')
+            options.ignore_code.end_file(reporter)
+            assert len(os.listdir(cache_dir)) == 3
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_warm(self):
+        try:
+            options = parse_options('/foo/ : E101', putty_warm=True)
+        finally:
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+        assert options.ignore_code.warm_time >= 0
+        rule = options.putty_ignore.rules[0]
+        assert rule.regex_selectors[0]._compiled_regex
+        assert len(options.putty_ignore._subsets) == 1
+        reporter = FakeReporter(lines=['foo\n'])
+        assert options.ignore_code.ignore_error(reporter, 1, 'E101')
+        assert len(options.putty_ignore._subsets) == 1
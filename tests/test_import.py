@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Test the cost of importing the extension."""
+from __future__ import unicode_literals
+
+import json
+import os
+import platform
+import subprocess
+import sys
+
+try:
+    from unittest2 import TestCase, SkipTest
+except ImportError:
+    from unittest import TestCase, SkipTest
+
+# Seconds flake8 may spend importing the extension, when not activated,
+# which slow CI machines may increase with PUTTY_IMPORT_TIME_BUDGET
+IMPORT_TIME_BUDGET = float(os.environ.get('PUTTY_IMPORT_TIME_BUDGET', 0.2))
+
+# Modules which are only imported when used
+LAZY_MODULES = (
+    'packaging', 'flake8_putty.cache', 'hashlib', 'tempfile', 'copy', 'gc',
+    'bisect',
+)
+
+IMPORT_SCRIPT = """
+import json
+import sys
+import time
+
+# Imported by flake8 before loading extensions
+import flake8.engine
+
+modules = set(sys.modules)
+start = time.time()
+import flake8_putty
+elapsed = time.time() - start
+print(json.dumps([elapsed, sorted(set(sys.modules) - modules)]))
+"""
+
+
+def import_extension():
+    """Return the time taken to import the extension, and modules imported."""
+    process = subprocess.Popen(
+        [sys.executable, '-c', IMPORT_SCRIPT],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output = process.communicate()[0]
+    assert process.returncode == 0
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+class TestImport(TestCase):
+
+    """Test importing the extension."""
+
+    def test_lazy_modules(self):
+        elapsed, modules = import_extension()
+        assert 'flake8_putty.extension' in modules
+        for module in modules:
+            assert module.split('.')[0] not in LAZY_MODULES, module
+            assert module not in LAZY_MODULES, module
+
+    def test_import_time(self):
+        if platform.python_implementation() != 'CPython':
+            raise SkipTest('Import time budget is for CPython')
+        elapsed = min(import_extension()[0] for i in range(3))
+        assert elapsed < IMPORT_TIME_BUDGET
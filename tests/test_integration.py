@@ -3,6 +3,8 @@
 from __future__ import unicode_literals
 
 import os.path
+import shutil
+import tempfile
 from unittest import TestCase
 
 try:
@@ -151,6 +153,142 @@ class TestIgnoreFile(IntegrationTestBase):
         )
 
 
+class TestIgnoreCode(IntegrationTestBase):
+
+    """Integration tests for ignoring with codes."""
+
+    def test_ignore_code(self):
+        def fake_stdin():
+            return "notathing # foo\n"
+        self.check_files(
+            fake_stdin,
+            arglist=['--putty-ignore=F821 : +E261'],
+            count=1,
+        )
+
+    def test_ignore_code_not_seen(self):
+        def fake_stdin():
+            return "notathing # foo\n"
+        self.check_files(
+            fake_stdin,
+            arglist=['--putty-ignore=F401 : +E261'],
+            count=2,
+        )
+
+
+class TestHooks(IntegrationTestBase):
+
+    """Integration tests for the hooks wrapping pep8."""
+
+    def fake_stdin(self):
+        return 'notathing=notathing # foo\n'
+
+    def test_idempotent(self):
+        for i in range(2):
+            self.check_files(
+                self.fake_stdin,
+                arglist=['--putty-ignore=F821 : +E261'],
+                count=2,
+            )
+        for hook in (pep8.BaseReport.error, pep8.StyleGuide.excluded,
+                     pep8.Checker.check_all):
+            assert hasattr(hook, 'putty_wrapped')
+            assert not hasattr(hook.putty_wrapped, 'putty_wrapped')
+
+    def test_without_putty(self):
+        self.check_files(
+            self.fake_stdin,
+            arglist=['--putty-ignore=F821 : +E261,E225'],
+            count=1,
+        )
+        assert hasattr(pep8.BaseReport.error, 'putty_wrapped')
+
+        style_guide = pep8.StyleGuide(
+            paths=['-'], reporter=pep8.BaseReport, ignore=['E261'])
+        assert not hasattr(style_guide.options.ignore_code, 'ignore_error')
+        result = style_guide.input_file(
+            'stdin.py', lines=self.fake_stdin().splitlines(True))
+        assert result == 2
+        counters = style_guide.options.report.counters
+        assert counters['E225'] == counters['F821'] == 1
+
+
+class TestSkipFile(IntegrationTestBase):
+
+    """Integration tests for skipping files with every code ignored."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tempdir, 'vendor'))
+        for name in ('vendor/foo.py', 'bar.py'):
+            with open(os.path.join(self.tempdir, name), 'w') as f:
+                f.write('notathing\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def check_dir(self, putty_ignore, count):
+        style_guide, total_errors = self.check_files(
+            arglist=['--putty-ignore=' + putty_ignore, self.tempdir],
+            explicit_stdin=False,
+            count=count,
+        )
+        return style_guide.options.report.counters['files']
+
+    def test_skip_file(self):
+        assert self.check_dir('*/vendor/*.py : E,W,F,C', count=1) == 1
+
+    def test_skip_file_partial(self):
+        assert self.check_dir('*/vendor/*.py : E,W,F', count=1) == 2
+
+    def test_skip_file_conditional(self):
+        putty_ignore = """
+            */vendor/*.py : E,W,F,C
+            */vendor/*.py, /notathing/ : E
+            """
+        assert self.check_dir(putty_ignore, count=2) == 2
+
+
+class TestVerdictCache(IntegrationTestBase):
+
+    """Integration tests for caching verdicts of errors."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tempdir, 'cache')
+        with open(os.path.join(self.tempdir, 'foo.py'), 'w') as f:
+            f.write('notathing\nnotathing2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_verdict_cache(self):
+        arglist = [
+            '--putty-ignore=/notathing$/ : +F821',
+            '--putty-cache-dir=' + self.cache_dir,
+            os.path.join(self.tempdir, 'foo.py'),
+        ]
+        self.check_files(arglist=arglist, explicit_stdin=False, count=1)
+        assert len(os.listdir(self.cache_dir)) == 2
+        self.check_files(arglist=arglist, explicit_stdin=False, count=1)
+        assert len(os.listdir(self.cache_dir)) == 2
+
+    def test_same_content(self):
+        for name in ('vendor', 'src'):
+            os.mkdir(os.path.join(self.tempdir, name))
+            with open(os.path.join(self.tempdir, name, 'a.py'), 'w') as f:
+                f.write('import os\nos;\nnotathing\n')
+        arglist = [
+            '--putty-ignore=*/vendor/*.py : +E703',
+            '--putty-cache-dir=' + self.cache_dir,
+            os.path.join(self.tempdir, 'vendor'),
+            os.path.join(self.tempdir, 'src'),
+        ]
+        self.check_files(arglist=arglist, explicit_stdin=False, count=3)
+        assert len(os.listdir(self.cache_dir)) == 3
+        self.check_files(arglist=arglist, explicit_stdin=False, count=3)
+
+
 class TestIgnoreTrailingNewLine(IntegrationTestBase):
 
     r"""Integration tests for matching against trailing \n in line."""
@@ -227,6 +365,18 @@ class TestIgnoreRegex(IntegrationTestBase):
             arglist=['--putty-ignore=/notathing/ : +F821'],
         )
 
+    def test_ignore_regex_eager_scan(self):
+        def fake_stdin():
+            return "notathing\nnotathing2\n"
+        self.check_files(
+            fake_stdin,
+            arglist=[
+                '--putty-eager-scan',
+                '--putty-ignore=/notathing$/ : +F821',
+            ],
+            count=1,
+        )
+
     def test_ignore_multi(self):
         def fake_stdin():
             return "notathing # foo\n"
@@ -243,6 +393,14 @@ class TestIgnoreRegex(IntegrationTestBase):
             arglist=['--putty-auto-ignore'],
         )
 
+    def test_auto_ignore_eager_scan(self):
+        def fake_stdin():
+            return "notathing  # flake8: disable=F821\n"
+        self.check_files(
+            fake_stdin,
+            arglist=['--putty-auto-ignore', '--putty-eager-scan'],
+        )
+
     def test_auto_ignore_disabled(self):
         def fake_stdin():
             return "notathing  # flake8: disable=F821\n"
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Test filtering of flake8 reports."""
+from __future__ import unicode_literals
+
+import io
+import multiprocessing
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from flake8_putty.__main__ import main
+from flake8_putty.report import (
+    RECORD,
+    MappedLines,
+    ReportFilter,
+    _init_worker,
+    batch_records,
+    filter_main,
+    job_count,
+    parallel_filter,
+)
+
+from tests.test_extension import FakeOptions, parse_options
+
+REPORT = [
+    'a.py:1:1: F401 os imported but unused\n',
+    'a.py:2:1: F401 sys imported but unused\n',
+    'b.py:1:80: E501 line too long (81 > 79 characters)\n',
+    'b.py:2:1: E302 expected 2 blank lines, found 0\n',
+    'not a record\n',
+]
+
+
+class ReportTestBase(TestCase):
+
+    """Source files in a temporary directory."""
+
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.tempdir = tempfile.mkdtemp()
+        os.chdir(self.tempdir)
+        with open('a.py', 'w') as f:
+            f.write('import os\nimport sys\n')
+        with open('b.py', 'w') as f:
+            f.write('x = 1\ndef y(): pass\n')
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.tempdir)
+
+
+class TestMappedLines(ReportTestBase):
+
+    """Test lines of memory-mapped source files."""
+
+    def test_lines(self):
+        lines = MappedLines('b.py')
+        assert lines[1] == 'def y(): pass\n'
+        assert lines[0] == 'x = 1\n'
+        assert lines[-1] == lines[1]
+        assert len(lines) == 2
+        assert list(lines) == ['x = 1\n', 'def y(): pass\n']
+        self.assertRaises(IndexError, lambda: lines[2])
+        self.assertRaises(IndexError, lambda: lines[-3])
+
+    def test_lazy_index(self):
+        with open('c.py', 'w') as f:
+            f.write('x = 1\n' * 100)
+        lines = MappedLines('c.py')
+        assert lines[2] == 'x = 1\n'
+        assert len(lines._offsets) == 4
+        assert len(lines) == 100
+
+    def test_encoding(self):
+        with open('c.py', 'wb') as f:
+            f.write(b'# -*- coding: latin-1 -*-\r\nx = 1  # \xe9\r\ny')
+        lines = MappedLines('c.py')
+        assert list(lines) == [
+            '# -*- coding: latin-1 -*-\n', 'x = 1  # \xe9\n', 'y']
+
+    def test_empty(self):
+        open('c.py', 'w').close()
+        assert list(MappedLines('c.py')) == []
+        assert len(MappedLines('missing.py')) == 0
+
+
+class TestReportFilter(ReportTestBase):
+
+    """Test filtering records with rules."""
+
+    def test_record(self):
+        match = RECORD.match(REPORT[2])
+        assert match.group('filename') == 'b.py'
+        assert match.group('line_number') == '1'
+        assert match.group('code') == 'E501'
+        match = RECORD.match('c:/a.py:3: W391 blank line at end of file\n')
+        assert match.group('filename') == 'c:/a.py'
+        assert match.group('code') == 'W391'
+        assert not RECORD.match(REPORT[4])
+
+    def test_filter(self):
+        options = parse_options("""
+            /sys/ : F401
+            b.py : E501
+            """)
+        kept = list(ReportFilter(options).filter(REPORT))
+        assert kept == [REPORT[0], REPORT[3], REPORT[4]]
+
+    def test_code_selector(self):
+        options = parse_options('E501 : +E302')
+        kept = list(ReportFilter(options).filter(REPORT))
+        assert kept == [REPORT[0], REPORT[1], REPORT[2], REPORT[4]]
+
+    def test_missing_file(self):
+        options = parse_options('/os/ : F401')
+        report = ['c.py:1:1: F401 os imported but unused\n']
+        assert list(ReportFilter(options).filter(report)) == report
+
+    def test_bounded_sources(self):
+        options = parse_options('/def/ : E302')
+        report_filter = ReportFilter(options, cache_size=1)
+        assert list(report_filter.filter(REPORT * 3)) == [
+            record for record in REPORT * 3 if record != REPORT[3]]
+        assert len(report_filter._sources) == 1
+        assert 'b.py' in report_filter._sources
+
+    def test_unread_sources(self):
+        options = parse_options("""
+            a.py : F401
+            b.py, /def/ : E302
+            """)
+        report_filter = ReportFilter(options)
+        kept = list(report_filter.filter(REPORT))
+        assert kept == REPORT[2:3] + REPORT[4:]
+        assert report_filter.source('a.py').lines == ()
+        assert isinstance(report_filter.source('b.py').lines, MappedLines)
+
+    def test_auto_ignore_lazy(self):
+        with open('c.py', 'w') as f:
+            f.write('x = 1  # comment\n' + 'x = 1\n' * 99 +
+                    'y = 2  # flake8: disable=E225\n')
+        options = parse_options(putty_auto_ignore=True)
+        report_filter = ReportFilter(options)
+        report = [
+            'c.py:1:2: E225 missing whitespace around operator\n',
+            'c.py:101:2: E225 missing whitespace around operator\n',
+        ]
+        lines = report_filter.source('c.py').lines
+        assert list(report_filter.filter(report[:1])) == report[:1]
+        assert len(lines._offsets) == 3
+        assert list(report_filter.filter(report[1:])) == []
+
+    def test_ignore_code(self):
+        options = FakeOptions()
+        options.ignore_code = lambda code: code.startswith('F')
+        kept = list(ReportFilter(options).filter(REPORT))
+        assert kept == REPORT[2:]
+
+    def test_pickle(self):
+        options = parse_options('/sys/ : F401')
+        report_filter = ReportFilter(options)
+        list(report_filter.filter(REPORT))
+        report_filter = pickle.loads(pickle.dumps(report_filter))
+        kept = list(report_filter.filter(REPORT))
+        assert kept == [REPORT[0]] + REPORT[2:]
+
+
+class TestParallelFilter(ReportTestBase):
+
+    """Test filtering records with a pool of processes."""
+
+    def test_batch_records(self):
+        report = ['header\n'] + REPORT + REPORT[:1]
+        assert list(batch_records(report)) == [
+            ['header\n'] + REPORT[:2],
+            REPORT[2:],
+            REPORT[:1],
+        ]
+        assert list(batch_records([])) == []
+
+    def test_job_count(self):
+        assert job_count(None) == 1
+        assert job_count(3) == 3
+        assert job_count('2') == 2
+        assert job_count('auto') == multiprocessing.cpu_count()
+
+    def test_parallel_filter(self):
+        options = parse_options("""
+            /sys/ : F401
+            b.py : E501
+            """)
+        report_filter = ReportFilter(options)
+        report = REPORT * 10
+        pool = multiprocessing.Pool(2, _init_worker, (report_filter, ))
+        try:
+            kept = list(parallel_filter(pool, 2, report))
+        finally:
+            pool.terminate()
+            pool.join()
+        assert kept == list(report_filter.filter(report))
+
+    def test_jobs(self):
+        stdout = io.StringIO()
+        status = filter_main(
+            ['--putty-ignore=/os/ : F401', '--jobs=2'],
+            stdin=io.StringIO(''.join(REPORT * 10)), stdout=stdout)
+        assert status == 1
+        assert stdout.getvalue() == ''.join(
+            [REPORT[1], REPORT[2], REPORT[3], REPORT[4]] * 10)
+
+
+class TestFilterMain(ReportTestBase):
+
+    """Test the filter command."""
+
+    def test_stdin(self):
+        stdout = io.StringIO()
+        status = filter_main(
+            ['--putty-ignore=/os/ : F401', '--ignore=E501'],
+            stdin=io.StringIO(''.join(REPORT)), stdout=stdout)
+        assert status == 1
+        assert stdout.getvalue() == ''.join(
+            [REPORT[1], REPORT[3], REPORT[4]])
+
+    def test_stdin_option_values(self):
+        stdout = io.StringIO()
+        status = filter_main(
+            ['--putty-ignore', '/os/ : F401', '--jobs', '1'],
+            stdin=io.StringIO(''.join(REPORT)), stdout=stdout)
+        assert status == 1
+        assert stdout.getvalue() == ''.join(REPORT[1:])
+
+    def test_report_file(self):
+        with io.open('report.txt', 'w') as f:
+            f.write(''.join(REPORT[:2]))
+        stdout = io.StringIO()
+        status = filter_main(
+            ['--putty-ignore=a.py : F401', 'report.txt'], stdout=stdout)
+        assert status == 0
+        assert stdout.getvalue() == ''
+
+    def test_usage(self):
+        assert main([]) == 2
+        assert main(['unknown']) == 2
+
+    def test_module(self):
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'flake8_putty', 'filter',
+             '--putty-ignore=/sys/ : F401'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=self.orig_dir))
+        stdout, stderr = process.communicate(''.join(REPORT[:2]).encode())
+        assert process.returncode == 1, stderr
+        assert stdout.decode().splitlines() == [REPORT[0].rstrip('\n')]
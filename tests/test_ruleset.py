@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""Test compiled rule sets."""
+from __future__ import unicode_literals
+
+import os
+
+try:
+    from unittest2 import TestCase, SkipTest
+except ImportError:
+    from unittest import TestCase, SkipTest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock  # Python 3.2 and lower
+
+from flake8_putty.config import FileSelector, Parser, Rule, import_markers
+from flake8_putty.engine import reference_codes
+from flake8_putty.extension import AutoLineDisableRule
+from flake8_putty.ruleset import (
+    ActiveRules,
+    CodeSets,
+    FileMatcher,
+    LRUCache,
+    RuleSet,
+    _InsertionOrder,
+    ignore_code,
+)
+
+
+class TestLRUCache(TestCase):
+
+    """Test the bounded cache."""
+
+    def test_get_missing(self):
+        cache = LRUCache(2)
+        assert cache.get('foo') is None
+        assert cache.get('foo', ()) == ()
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache['foo'] = 1
+        cache['bar'] = 2
+        cache['baz'] = 3
+        assert len(cache) == 2
+        assert 'foo' not in cache
+        assert cache.get('bar') == 2
+        assert cache.get('baz') == 3
+
+    def test_eviction_recently_used(self):
+        cache = LRUCache(2)
+        cache['foo'] = 1
+        cache['bar'] = 2
+        assert cache.get('foo') == 1
+        cache['baz'] = 3
+        assert 'bar' not in cache
+        assert cache.get('foo') == 1
+
+    def test_insertion_order(self):
+        with mock.patch(
+                'flake8_putty.ruleset._OrderedDict', _InsertionOrder):
+            cache = LRUCache(2)
+            assert isinstance(cache._data, _InsertionOrder)
+            self.test_eviction()
+            self.test_eviction_recently_used()
+            cache['foo'] = 1
+            cache.clear()
+            assert len(cache) == 0
+
+
+class TestRuleSet(TestCase):
+
+    """Test selecting the rules applicable to a file."""
+
+    def test_for_file(self):
+        rules = Parser("""
+        foo.py : E101
+        /foo/ : E102
+        tests/ : E103
+        foo.py, bar.py : E104
+        """)._rules
+        ruleset = RuleSet(rules)
+        assert ruleset.for_file('foo.py').rules == (
+            rules[0], rules[1], rules[3],
+        )
+        assert ruleset.for_file('tests/foo.py').rules == (
+            rules[1], rules[2],
+        )
+        assert ruleset.for_file('baz.py').rules == (rules[1], )
+
+    def test_for_file_cached(self):
+        rules = Parser('foo.py : E101')._rules
+        ruleset = RuleSet(rules, cache_size=1)
+        assert ruleset.for_file('foo.py') is ruleset.for_file('foo.py')
+        assert ruleset.for_file('bar.py').rules == ()
+        assert 'foo.py' not in ruleset._file_rules
+
+    def test_auto_rule(self):
+        rule = AutoLineDisableRule()
+        ruleset = RuleSet([rule])
+        assert ruleset.for_file('foo.py').rules == (rule, )
+
+
+class TestRegexMatcher(TestCase):
+
+    """Test scanning a line for all regex selectors at once."""
+
+    def _scan(self, text, line):
+        rules = Parser(text)._rules
+        ruleset = RuleSet(rules)
+        return ruleset.for_file('foo.py').matcher.scan(line)
+
+    def test_overlapping(self):
+        hits = self._scan("""
+        /foo/ : E101
+        /oo/ : E102
+        /bar/ : E103
+        /^$/ : E104
+        """, 'foo')
+        assert hits == {0: True, 1: True}
+
+    def test_multi(self):
+        hits = self._scan('/bar/, /foo/ : E101', 'foo')
+        assert hits == {0: True}
+
+    def test_flags(self):
+        hits = self._scan("""
+        /(?i)FOO/ : E101
+        /(f)o\\1/ : E102
+        """, 'foo fof')
+        assert hits == {0: True, 1: True}
+
+    def test_codes(self):
+        text = '/disable=(?P<codes>[A-Z0-9]*)/ : +(?P<codes>)'
+        hits = self._scan(text, 'foo # disable=E101 disable=E102')
+        assert hits == {0: set(['E101', 'E102'])}
+
+        hits = self._scan(text, 'foo # disable=')
+        assert hits == {}
+
+    def test_many(self):
+        text = '\n'.join('/foo%d;/ : E101' % i for i in range(200))
+        hits = self._scan(text, 'foo7; foo150;')
+        assert hits == {7: True, 150: True}
+
+
+class TestCommentMatcher(TestCase):
+
+    """Test scanning the comments of a file for comment rules."""
+
+    def test_auto_rule(self):
+        file_rules = RuleSet([AutoLineDisableRule()]).for_file('foo.py')
+        assert file_rules.matcher is None
+        hits = file_rules.comment_matcher.scan(
+            'foo # flake8: disable=E101, E102')
+        assert hits == {0: set(['E101', 'E102'])}
+
+    def test_may_match(self):
+        file_rules = RuleSet([AutoLineDisableRule()]).for_file('foo.py')
+        matcher = file_rules.comment_matcher
+        assert matcher.may_match('foo  # flake8: disable=E101\n')
+        assert matcher.may_match('foo = "# flake8: disable=E101"\n')
+        assert not matcher.may_match('foo  # a comment\n')
+
+        rules = Parser('/^ *!qa/ : E101')._rules
+        rules[0].comments_only = True
+        file_rules = RuleSet(rules).for_file('foo.py')
+        assert file_rules.comment_matcher.may_match('foo  # !qa\n')
+
+    def test_scan_lines(self):
+        lines = [
+            'foo = 1  # flake8: disable=E101\n',
+            'bar = "# flake8: disable=E102"\n',
+            'baz = """\n',
+            '# flake8: disable=E103\n',
+            '"""  # flake8: disable=E104, E105\n',
+            '\n',
+        ]
+        file_rules = RuleSet([AutoLineDisableRule()]).for_file('foo.py')
+        assert file_rules.scan_comments(lines) == {
+            1: {0: set(['E101'])},
+            5: {0: set(['E104', 'E105'])},
+        }
+
+    def test_scan_lines_untokenizable(self):
+        lines = [
+            'foo = 1  # flake8: disable=E101\n',
+            'bar = """  # flake8: disable=E102\n',
+            '# flake8: disable=E103\n',
+        ]
+        file_rules = RuleSet([AutoLineDisableRule()]).for_file('foo.py')
+        assert file_rules.scan_comments(lines) == {
+            1: {0: set(['E101'])},
+            2: {0: set(['E102'])},
+            3: {0: set(['E103'])},
+        }
+
+
+class TestFileRules(TestCase):
+
+    """Test matching the rules applicable to a file."""
+
+    def test_apply(self):
+        rules = Parser("""
+        /foo/ : E101
+        E200 : +E102
+        /# !qa: *(?P<codes>[A-Z0-9, ]*)/ : +(?P<codes>)
+        """)._rules
+        file_rules = RuleSet(rules).for_file('foo.py')
+        code_sets = CodeSets()
+
+        def apply(line, seen_codes):
+            active = ActiveRules(file_rules)
+            for code in seen_codes[:-1]:
+                active.add_code(code)
+            code = seen_codes[-1]
+            codes_id = file_rules.apply(
+                code_sets, code_sets.intern(()), line, code,
+                active.candidates(code))
+            return code_sets.codes[codes_id]
+
+        assert apply('foo', ['E300']) == ('E101', )
+        assert apply('foo', ['E200', 'E300']) == ('E101', 'E102')
+        assert apply('bar # !qa: E300', ['E300']) == ('E300', )
+        assert rules[2].codes == ('(?P<codes>)', )
+        assert apply('bar # !qa: E300', ['E301']) == ()
+
+    def test_scan_lines(self):
+        rules = Parser("""
+        /foo/ : E101
+        /^$/ : E102
+        /o$/ : E103
+        /a\\s+b/ : E104
+        /\\Afoo/ : E105
+        /(?s)o.b/ : E106
+        /disable=(?P<codes>[A-Z0-9]*)/ : +(?P<codes>)
+        """)._rules
+        lines = [
+            'foo\n',
+            '\n',
+            'a\n',
+            ' b  # disable=E101 disable=E102\n',
+            'a b a\n',
+            'foo',
+        ]
+        file_rules = RuleSet(rules).for_file('foo.py')
+        line_hits = file_rules.scan_lines(lines)
+        for line_number, line in enumerate(lines, 1):
+            hits = file_rules.matcher.scan(line)
+            assert line_hits.get(line_number, {}) == hits, line_number
+
+        assert line_hits[1] == {0: True, 2: True, 4: True}
+        assert line_hits[4] == {6: set(['E101', 'E102'])}
+        assert line_hits[5] == {3: True}
+        assert file_rules.scan_lines([]) == {}
+
+    def test_scan_lines_lookaround(self):
+        rules = Parser("""
+        /foo(?=\\s*bar)/ : E101
+        /foo(?!\\s*bar)/ : E102
+        /(?<=o\\s)bar/ : E103
+        """)._rules
+        lines = ['foo\n', 'bar\n']
+        file_rules = RuleSet(rules).for_file('foo.py')
+        assert file_rules.scan_lines(lines) == {1: {1: True}}
+
+
+class TestFoldEnvironmentMarkers(TestCase):
+
+    """Test evaluating environment markers when compiling rules."""
+
+    @classmethod
+    def setUpClass(cls):
+        if not import_markers():
+            raise SkipTest('Package packaging not found')
+
+    def test_fold(self):
+        rules = Parser("""
+        foo.py, python_version == '2.4' : E101
+        foo.py, python_version > '2.4' : E102
+        foo.py : E103
+        """)._rules
+        ruleset = RuleSet(rules)
+        assert ruleset.rules == (
+            Rule([FileSelector('foo.py')], 'E102'),
+            rules[2],
+        )
+        assert ruleset.rules[0].environment_marker_selector is None
+        assert ruleset.rules[1] is rules[2]
+        assert rules[1].environment_marker_selector
+
+    def test_fold_marker_only(self):
+        rules = Parser("python_version > '2.4' : E101")._rules
+        ruleset = RuleSet(rules)
+        assert ruleset.for_file('foo.py').rules == (Rule([], 'E101'), )
+
+
+class TestFileMatcher(TestCase):
+
+    """Test matching the file selectors of all rules at once."""
+
+    def test_match(self):
+        rules = Parser("""
+        foo.py : E101
+        tests/ : E102
+        tests/foo/ : E103
+        tests/*/test_*.py, vendor/*/test_*.py : E104
+        ./foo.py, ./ : E105
+        tests/*.py, bar.py : E106
+        /foo/ : E107
+        """)._rules
+        matcher = FileMatcher(enumerate(rules))
+        filenames = [
+            'foo.py',
+            '.{0}foo.py'.format(os.sep),
+            'bar.py',
+            'foo/bar.py',
+            'tests/foo.py',
+            'tests/foo/test_bar.py',
+            'tests/foo/bar/test_baz.py',
+            'vendor/foo/test_bar.py',
+            'other/foo/test_bar.py',
+            'tests/',
+            'tests',
+        ]
+        for filename in filenames:
+            expected = set(
+                index for index, rule in enumerate(rules)
+                if rule.file_match_any(filename))
+            assert matcher.match(filename) == expected, filename
+
+        assert matcher.match('tests/foo/test_bar.py') == set([1, 2, 3, 5])
+
+    def test_many_globs(self):
+        rules = Parser('\n'.join(
+            'pkg{0}/*.py : E1{0:02d}'.format(i) for i in range(150)))._rules
+        matcher = FileMatcher(enumerate(rules))
+        assert len(matcher._glob_regexes) == 2
+        assert matcher.match('pkg3/foo.py') == set([3])
+        assert matcher.match('pkg142/foo.py') == set([142])
+        assert matcher.match('pkg150/foo.py') == set()
+
+
+class TestCodeSets(TestCase):
+
+    """Test interned codes and cached verdicts."""
+
+    def test_intern(self):
+        code_sets = CodeSets()
+        codes_id = code_sets.intern(('E101', 'E102'))
+        assert code_sets.intern(['E101', 'E102']) == codes_id
+        assert code_sets.intern(('E101', )) != codes_id
+        assert code_sets.codes[codes_id] == ('E101', 'E102')
+
+    def test_append(self):
+        code_sets = CodeSets()
+        codes_id = code_sets.intern(('E101', ))
+        appended_id = code_sets.append(codes_id, ('E102', ))
+        assert code_sets.codes[appended_id] == ('E101', 'E102')
+        assert code_sets.append(codes_id, ('E102', )) == appended_id
+        assert code_sets.intern(('E101', 'E102')) == appended_id
+
+    def test_ignore_code(self):
+        code_sets = CodeSets()
+        selects = [(), ('E',), ('E1', 'W'), ('E101', )]
+        ignores = [(), ('',), ('E',), ('E1', 'W6')]
+        codes = ['E', 'E1', 'E101', 'E201', 'W601', 'F401']
+        for select in selects:
+            for ignore in ignores:
+                select_id = code_sets.intern(select)
+                ignore_id = code_sets.intern(ignore)
+                for code in codes:
+                    expected = ignore_code(select, ignore, code)
+                    for i in range(2):
+                        assert code_sets.ignore_code(
+                            select_id, ignore_id, code) == expected
+
+    def test_apply(self):
+        rules = Parser("""
+        /foo/ : +E101
+        foo.py : E102
+        E200 : +E103
+        /bar/ : E104
+        /# !qa: *(?P<codes>[A-Z0-9, ]*)/ : +(?P<codes>)
+        """)._rules
+        file_rules = RuleSet(rules).for_file('foo.py')
+        code_sets = CodeSets()
+        base_id = code_sets.intern(('W', ))
+        for line in ['', 'foo', 'bar', 'foo bar', 'foo  # !qa: E300']:
+            for seen_codes in [['E300'], ['E200', 'E300']]:
+                expected = reference_codes(
+                    rules, ('W', ), 'foo.py', line, seen_codes)
+                active = ActiveRules(file_rules)
+                for code in seen_codes[:-1]:
+                    active.add_code(code)
+                codes_id = file_rules.apply(
+                    code_sets, base_id, line, seen_codes[-1],
+                    active.candidates(seen_codes[-1]))
+                assert code_sets.codes[codes_id] == expected
+
+    def test_apply_reverse_precedence(self):
+        rules = Parser("""
+        /foo/ : E101
+        foo.py : E102
+        foo.py : +E103
+        """)._rules
+        file_rules = RuleSet(rules).for_file('foo.py')
+        file_rules.matcher = None
+        code_sets = CodeSets()
+        codes_id = file_rules.apply(
+            code_sets, code_sets.intern(()), 'foo', 'E300',
+            ActiveRules(file_rules).candidates('E300'))
+        assert code_sets.codes[codes_id] == ('E102', 'E103')
+
+    def test_unconditional_codes(self):
+        code_sets = CodeSets()
+        base_id = code_sets.intern(('W', ))
+        rules = Parser("""
+        /foo/ : E101
+        foo.py : E102
+        E200 : +E103
+        foo.py : +E104
+        """)._rules
+        file_rules = RuleSet(rules).for_file('foo.py')
+        codes_id = file_rules.unconditional_codes(code_sets, base_id)
+        assert code_sets.codes[codes_id] == ('E102', 'E104')
+
+        file_rules = RuleSet(rules[2:]).for_file('foo.py')
+        codes_id = file_rules.unconditional_codes(code_sets, base_id)
+        assert code_sets.codes[codes_id] == ('W', 'E104')
+
+        file_rules = RuleSet(rules[:1]).for_file('foo.py')
+        assert file_rules.unconditional_codes(code_sets, base_id) is None
+
+    def test_possible_codes(self):
+        code_sets = CodeSets()
+        base_id = code_sets.intern(('W', ))
+        rules = Parser("""
+        /foo/ : E101
+        E200 : +E103
+        /# !qa: *(?P<codes>[A-Z0-9, ]*)/ : +(?P<codes>)
+        """)._rules
+        file_rules = RuleSet(rules[:2]).for_file('foo.py')
+        codes_id = file_rules.possible_codes(code_sets, base_id)
+        assert code_sets.codes[codes_id] == ('W', 'E101', 'E103')
+
+        file_rules = RuleSet(rules).for_file('foo.py')
+        assert file_rules.possible_codes(code_sets, base_id) is None
+
+
+class TestActiveRules(TestCase):
+
+    """Test activating rules by the codes seen in a file."""
+
+    def test_candidates(self):
+        rules = Parser("""
+        E100 : E101
+        foo.py : E102
+        E200, E300 : +E103
+        """)._rules
+        active = ActiveRules(RuleSet(rules).for_file('foo.py'))
+        assert active.candidates('E400') == (1, )
+        assert active.candidates('E100') == [1, 0]
+        assert active.candidates('E400') == (1, )
+
+        active.add_code('E300')
+        assert active.candidates('E400') == (2, 1)
+        assert active.candidates('E100') == [2, 1, 0]
+        active.add_code('E200')
+        active.add_code('E100')
+        assert active.candidates('E400') == (2, 1, 0)
+        assert active.candidates('E100') == (2, 1, 0)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Test profiling of rules."""
+from __future__ import unicode_literals
+
+import io
+import json
+from unittest import TestCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock  # Python 3.2 and lower
+
+from flake8_putty.config import Parser
+from flake8_putty.extension import AutoLineDisableRule, PuttyIgnoreCode
+from flake8_putty.stats import (
+    StatsIgnoreCode,
+    collect_stats,
+    format_table,
+    print_stats,
+    rule_text,
+)
+
+from tests.test_extension import FakeReporter, parse_options
+
+
+def parse_stats_options(*args, **kwargs):
+    with mock.patch('atexit.register') as register:
+        options = parse_options(*args, **kwargs)
+    register.assert_called_once_with(
+        mock.ANY, options, options.putty_stats)
+    return options
+
+
+RULES = """
+    foo.py : +E101
+    /bar/ : E102
+    E103 : +E104
+    """
+
+
+class TestStatsIgnoreCode(TestCase):
+
+    """Test recording stats of each rule."""
+
+    def test_rule_text(self):
+        rules = Parser(RULES)._rules
+        assert rule_text(rules[0]) == 'foo.py : +E101'
+        assert rule_text(rules[1]) == '/bar/ : E102'
+        assert rule_text(AutoLineDisableRule()) == (
+            '/#.*flake8: disable=(?P<codes>[A-Z0-9, ]*)/ : +(?P<codes>)')
+
+    def test_ignore_error(self):
+        options = parse_stats_options(RULES, putty_stats='table')
+        assert isinstance(options.ignore_code, StatsIgnoreCode)
+        plain = parse_options(RULES)
+        assert type(plain.ignore_code) is PuttyIgnoreCode
+
+        reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+        plain_reporter = FakeReporter(lines=['foo\n', 'bar\n'])
+        errors = [(1, 'E101'), (1, 'E103'), (2, 'E104'), (2, 'E102')]
+        for line_number, code in errors:
+            assert (
+                options.ignore_code.ignore_error(
+                    reporter, line_number, code) ==
+                plain.ignore_code.ignore_error(
+                    plain_reporter, line_number, code))
+
+        stats = collect_stats(options.ignore_code, reporter.counters)
+        assert stats['errors'] == 4
+        assert stats['warm_seconds'] is None
+        rules = dict((rule['rule'], rule) for rule in stats['rules'])
+        assert len(rules) == 3
+        assert rules['foo.py : +E101']['evaluations'] == 4
+        assert rules['foo.py : +E101']['matches'] == 4
+        assert rules['/bar/ : E102']['matches'] == 2
+        assert rules['E103 : +E104']['matches'] == 3
+        assert rules['E103 : +E104']['regex_seconds'] == 0
+        assert stats['rules'] == sorted(
+            stats['rules'], key=lambda rule: rule['seconds'], reverse=True)
+
+        lines = format_table(stats)
+        assert lines[0].startswith('putty: 4 errors decided in ')
+        assert len(lines) == 5
+
+    def test_engine_ignored(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            options = parse_stats_options(
+                RULES, putty_stats='table', putty_engine='reference')
+        assert isinstance(options.ignore_code, StatsIgnoreCode)
+        assert stderr.getvalue() == (
+            'putty: --putty-stats uses the compiled engine, '
+            'ignoring --putty-engine=reference\n')
+
+    def test_print_stats_json(self):
+        options = parse_stats_options(RULES, putty_stats='json')
+        options.report = FakeReporter(lines=['foo\n'])
+        options.ignore_code.ignore_error(options.report, 1, 'E101')
+
+        stream = io.StringIO()
+        print_stats(options, 'json', stream)
+        stats = json.loads(stream.getvalue())
+        assert stats['errors'] == 1
+        assert len(stats['rules']) == 3